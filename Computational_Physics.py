@@ -1,83 +1,104 @@
-from pylab import *
-from scipy.optimize import leastsq
+from numpy import sin, pi, linspace, sqrt, diag
 from numpy import random
-
-
-def residuals(p, y, t):
-    err = y - sine_signal(t, p)
-    return err
+from batch_fitting import fit_sine_batch, basis_model, fit_batch
+from online_fitting import OnlineSineFitter, stream_fit
+from plotting import renderer_from_arguments
 
 
 def sine_signal(t, p):
     return p[0] * sin(2 * pi * t / p[1] + p[2])
 
 
-# number of points in original time series
-n = 80
-
-# time dimension: we generate the time values
-t = linspace(0, 20, n)
-signal_amp = 3.0
-phase = -pi / 6
-period = 6.0
-
-p = signal_amp, period, phase
-signal = sine_signal(t, p)
-
-# introduce noise into the signal
-noise_amp = 0.2 * signal_amp
-noise = noise_amp * random.standard_normal(n)
-signal_plus_noise = signal + noise
-# initial guess of parameters
-p0 = 10 * signal_amp, 1.3 * period, 1.8 * phase
-
-# perform least square fit
-plsq = leastsq(residuals, p0, args=(signal_plus_noise, t))
-
-# plot data and fit curve
-plot(t, signal, 'bo')
-plot(t, signal_plus_noise, 'ko')
-plot(t, sine_signal(t, plsq[0]), 'r--')
-legend(('Signal', 'Signal+noise', 'fit'), loc='best')
-title('Fit for a time series')
-show()
-
-from pylab import *
-from scipy.optimize import leastsq
-from numpy import random
-
-
-def residuals(p, v, t):
-    err = v - velocity(t, p)
-    return err
-
-
 def velocity(t, p):
     return p * t
 
 
-# number of points in original time series
-n = 100
-
-# time dimension: we generate the time values
-t = linspace(0, 20, n)
-
-# initial guess for acceleration
-p0 = 5
-# actual signal
-signal = velocity(t, 9.81)
-
-# introduce noise into the signal
-noise = 0.1 * signal * random.standard_normal(n)
-signal_plus_noise = signal + noise
-
-# perform least square fit
-plsq = leastsq(residuals, p0, args=(signal_plus_noise, t))
-
-# plot data and fit curve
-plot(t, signal, 'bo')
-plot(t, signal_plus_noise, 'ko')
-plot(t, velocity(t, plsq[0]), 'ro-')
-legend(('Signal', 'Signal+noise', 'fit'), loc='best')
-title('Fit for a time series')
-show()
\ No newline at end of file
+def sine_fit(renderer):
+    # number of points in original time series
+    n = 80
+
+    # time dimension: we generate the time values
+    t = linspace(0, 20, n)
+    signal_amp = 3.0
+    phase = -pi / 6
+    period = 6.0
+
+    p = signal_amp, period, phase
+    signal = sine_signal(t, p)
+
+    # introduce noise into the signal
+    noise_amp = 0.2 * signal_amp
+    noise = noise_amp * random.standard_normal(n)
+    signal_plus_noise = signal + noise
+    # initial guess of parameters
+    p0 = 10 * signal_amp, 1.3 * period, 1.8 * phase
+
+    # perform least square fit (batched Levenberg-Marquardt with the analytic Jacobian, no Python residuals callback)
+    # The initial guess is estimated from the data (FFT + linear amplitude/phase fit); p0 above is only the baseline it is compared to
+    fit = fit_sine_batch(t, signal_plus_noise, baseline_p0=p0)
+    p_fit = fit["parameters"][0]
+    print("Estimated initial guess:", fit["initial_parameters"][0])
+    print("Fitted parameters:", p_fit, "converged:", fit["converged"][0], "iterations:", fit["iterations"][0])
+    print("Iterations saved:", fit["iterations_saved"][0], "function evaluations saved:", fit["evaluations_saved"][0])
+    print("Parameter standard errors:", sqrt(diag(fit["covariance"][0])))
+
+    # The same engine fits many traces at once, stacked time x trace
+    n_traces = 1000
+    traces = signal[:, None] + noise_amp * random.standard_normal((n, n_traces))
+    batch_fit = fit_sine_batch(t, traces)
+    print("Batch of", n_traces, "traces, converged:", batch_fit["converged"].sum(), "mean fitted period:", batch_fit["parameters"][:, 1].mean())
+
+    # Streaming fit: the series arrives in chunks and the estimate is updated after each one with bounded memory
+    def acquisition_chunks(chunk_size=20):
+        for start in range(0, n, chunk_size):
+            yield t[start:start + chunk_size], signal_plus_noise[start:start + chunk_size]
+
+    for estimate in stream_fit(acquisition_chunks(), OnlineSineFitter(p0=fit["initial_parameters"][0])):
+        print("Streaming estimate after", estimate["n_points"], "points:", estimate["parameters"][0])
+
+    # plot data and fit curve
+    pyplot = renderer.pyplot
+    pyplot.plot(t, signal, 'bo')
+    pyplot.plot(t, signal_plus_noise, 'ko')
+    pyplot.plot(t, sine_signal(t, p_fit), 'r--')
+    pyplot.legend(('Signal', 'Signal+noise', 'fit'), loc='best')
+    pyplot.title('Fit for a time series')
+    renderer.save("sine_fit")
+
+
+def velocity_fit(renderer):
+    # number of points in original time series
+    n = 100
+
+    # time dimension: we generate the time values
+    t = linspace(0, 20, n)
+
+    # initial guess for acceleration
+    p0 = 5
+    # actual signal
+    signal = velocity(t, 9.81)
+
+    # introduce noise into the signal
+    noise = 0.1 * signal * random.standard_normal(n)
+    signal_plus_noise = signal + noise
+
+    # perform least square fit (velocity is linear in p, so it is detected as linear and solved in closed form)
+    velocity_function, velocity_jacobian = basis_model(lambda t: t)
+    fit = fit_batch(velocity_function, velocity_jacobian, t, signal_plus_noise, p0=[p0])
+    plsq = fit["parameters"][0]
+    print("Fitted acceleration:", plsq[0], "+/-", sqrt(fit["covariance"][0, 0, 0]), "linear:", fit["linear"])
+
+    # plot data and fit curve
+    pyplot = renderer.pyplot
+    pyplot.plot(t, signal, 'bo')
+    pyplot.plot(t, signal_plus_noise, 'ko')
+    pyplot.plot(t, velocity(t, plsq[0]), 'ro-')
+    pyplot.legend(('Signal', 'Signal+noise', 'fit'), loc='best')
+    pyplot.title('Fit for a time series')
+    renderer.save("velocity_fit")
+
+
+if __name__ == "__main__":
+    renderer = renderer_from_arguments()
+    sine_fit(renderer)
+    velocity_fit(renderer)
@@ -0,0 +1,334 @@
+# Batched Least Squares Fitting
+
+# Fits the same model to many independent traces at once with vectorized Levenberg-Marquardt steps
+# Data is stacked time x trace, y.shape == (n_points, n_traces), as produced by e.g. np.column_stack(traces)
+# The time axis is either shared, t.shape == (n_points,), or per trace, t.shape == (n_points, n_traces)
+# Models are a pair of vectorized functions working on all traces together (no per-trace Python callbacks):
+#   function(t, p) -> (n_traces, n_points)             t is (1 or n_traces, n_points), p is (n_traces, n_parameters)
+#   jacobian(t, p) -> (n_traces, n_points, n_parameters)
+# The result is a dict of per-trace arrays: parameters, covariance, converged, iterations, evaluations, cost
+# converged is False for failed fits (NaN/inf samples, or no step reduces the cost), their parameters are not a fit
+# Without p0 the sine fit starts from sine_initial_guess(), which estimates the period from the data (FFT for a uniform
+# shared time axis, Lomb-Scargle periodogram otherwise) and the amplitude and phase from a linear fit at that period
+# Models that are linear in their parameters (polynomials, sums of basis functions, velocity = p*t) are solved in closed
+# form with one QR (shared time axis and weights) or one batched normal-equation solve, see fit_linear_batch() and fit_batch()
+#
+# Usage:
+#   result = fit_sine_batch(t, y, p0)     # p0 is (3,) for all traces or (n_traces, 3)
+#   result = fit_sine_batch(t, y)         # initial guess estimated from the data
+#   result["parameters"][:, 1]            # fitted periods
+#   function, jacobian = basis_model(lambda t: t)          # velocity(t, p) = p*t
+#   result = fit_batch(function, jacobian, t, y)           # detected as linear, solved in closed form
+
+
+import numpy as np
+
+from instrumentation import count, instrument
+
+
+
+# Sine model p[0]*sin(2*pi*t/p[1] + p[2]), same as sine_signal() in Computational_Physics.py:
+def sine_signal_batch(t, p):
+    return p[:, 0:1] * np.sin(2 * np.pi * t / p[:, 1:2] + p[:, 2:3])
+
+
+def sine_jacobian_batch(t, p):
+    amplitude, period = p[:, 0:1], p[:, 1:2]
+    theta = 2 * np.pi * t / period + p[:, 2:3]
+    sin_theta, cos_theta = np.sin(theta), np.cos(theta)
+    jacobian = np.empty(np.broadcast(theta, p[:, 0:1]).shape + (3,))
+    jacobian[..., 0] = sin_theta                                            # d/d amplitude
+    jacobian[..., 1] = amplitude * cos_theta * (-2 * np.pi * t / period**2)  # d/d period
+    jacobian[..., 2] = amplitude * cos_theta                                # d/d phase
+    return jacobian
+
+
+
+# Bring the (n_points, n_traces) inputs into the (n_traces, n_points) layout used internally:
+def _traces_first(t, y, sigma):
+    y = np.asarray(y, dtype=np.float64)
+    if y.ndim == 1:
+        y = y[:, None]
+    y = np.ascontiguousarray(y.T)
+
+    t = np.asarray(t, dtype=np.float64)
+    t = t[None, :] if t.ndim == 1 else np.ascontiguousarray(t.T)
+
+    if sigma is None:
+        weights = np.ones_like(y)
+    else:
+        sigma = np.asarray(sigma, dtype=np.float64)
+        sigma = sigma[None, :] if sigma.ndim == 1 else sigma.T
+        weights = np.broadcast_to(1 / sigma, y.shape).copy()
+    return t, y, weights
+
+
+def _rows(array, index):   # Select traces, keeping a shared (1, n_points) time axis shared
+    return array if array.shape[0] == 1 else array[index]
+
+
+
+# Batched Levenberg-Marquardt:
+# Each iteration builds the normal equations J^T W J and J^T W r of all active traces with batched matmuls and solves the
+# (n_traces, k, k) systems with one np.linalg.solve call. The damping lambda is adapted per trace, and traces that
+# have converged are dropped from the active set so they cost nothing in later iterations.
+@instrument("fit.levenberg_marquardt_batch")
+def levenberg_marquardt_batch(function, jacobian, t, y, p0, sigma=None, max_iterations=100, tol=1e-10, damping=1e-3):
+    t, y, weights = _traces_first(t, y, sigma)
+    n_traces, n_points = y.shape
+    parameters = np.array(np.broadcast_to(np.asarray(p0, dtype=np.float64), (n_traces, np.shape(p0)[-1])))
+    n_parameters = parameters.shape[1]
+
+    residual = (y - function(t, parameters)) * weights
+    count("fit.function_evaluations", n_traces)
+    cost = np.einsum("ij,ij->i", residual, residual)
+    evaluations = np.ones(n_traces, dtype=np.int64)
+    iterations = np.zeros(n_traces, dtype=np.int64)
+    converged = np.zeros(n_traces, dtype=bool)
+    lam = np.full(n_traces, damping)
+    active = np.flatnonzero(np.isfinite(cost))     # Traces with NaN/inf samples or residuals at p0 fail right away
+
+    for _ in range(max_iterations):
+        if active.size == 0:
+            break
+        t_a, y_a, w_a, p_a = _rows(t, active), y[active], weights[active], parameters[active]
+
+        J = jacobian(t_a, p_a) * w_a[..., None]
+        count("fit.jacobian_evaluations", active.size)
+        JT = J.transpose(0, 2, 1)
+        JTJ = JT @ J
+        JTr = (JT @ residual[active][..., None])[..., 0]
+        diagonal = np.einsum("ikk->ik", JTJ)
+        damped = JTJ + (lam[active, None] * np.maximum(diagonal, 1e-300))[:, :, None] * np.eye(n_parameters)
+        try:
+            step = np.linalg.solve(damped, JTr[..., None])[..., 0]
+        except np.linalg.LinAlgError:   # Singular for some trace, fall back to a least squares solve per trace
+            step = np.stack([np.linalg.lstsq(damped[k], JTr[k], rcond=None)[0] for k in range(active.size)])
+
+        trial = p_a + step
+        trial_residual = (y_a - function(t_a, trial)) * w_a
+        count("fit.function_evaluations", active.size)
+        trial_cost = np.einsum("ij,ij->i", trial_residual, trial_residual)
+        evaluations[active] += 1
+        iterations[active] += 1
+
+        improved = trial_cost < cost[active]
+        accepted = active[improved]
+        previous_cost = cost[accepted]
+        parameters[accepted] = trial[improved]
+        residual[accepted] = trial_residual[improved]
+        cost[accepted] = trial_cost[improved]
+        lam[accepted] = np.maximum(lam[accepted] / 10, 1e-12)
+        lam[active[~improved]] *= 10
+
+        # Converged when an accepted step barely changes the cost or the parameters; a trace whose damping blew up
+        # (no step improves the cost any more) is done but not converged
+        small_change = np.zeros(active.size, dtype=bool)
+        small_change[improved] = ((previous_cost - cost[accepted]) <= tol * np.maximum(previous_cost, 1e-300)) | \
+                                 (np.abs(step[improved]) <= tol * (np.abs(parameters[accepted]) + tol)).all(axis=1)
+        success = small_change | (cost[active] == 0)
+        converged[active[success]] = True
+        active = active[~(success | (lam[active] > 1e16))]
+
+    # Covariance of the parameters, s^2 (J^T W J)^-1 with s^2 = cost/(n - k) (cost is the weighted chi^2 if sigma is given)
+    J = jacobian(t, parameters) * weights[..., None]
+    JTJ = J.transpose(0, 2, 1) @ J
+    degrees_of_freedom = max(n_points - n_parameters, 1)
+    scale = 1.0 if sigma is not None else (cost / degrees_of_freedom)[:, None, None]
+    covariance = np.full(JTJ.shape, np.nan)     # NaN for failed traces with non-finite parameters
+    finite = np.isfinite(JTJ).all(axis=(1, 2))
+    covariance[finite] = np.linalg.pinv(JTJ[finite])
+    covariance *= scale
+
+    return {
+        "parameters": parameters,
+        "covariance": covariance,
+        "converged": converged,
+        "iterations": iterations,
+        "evaluations": evaluations,
+        "cost": cost,
+    }
+
+
+
+# Dominant frequency of every trace from a zero-padded FFT (uniform sampling, shared time axis):
+def _fft_frequencies(dt, y, padding=4):
+    n_traces, n_points = y.shape
+    n_fft = padding * n_points
+    magnitude = np.abs(np.fft.rfft(y - y.mean(axis=1, keepdims=True), n=n_fft, axis=1))
+    k = np.clip(np.argmax(magnitude[:, 1:], axis=1) + 1, 1, magnitude.shape[1] - 2)     # Skip the DC bin
+
+    # Parabolic interpolation of the peak between the neighbouring bins
+    rows = np.arange(n_traces)
+    m0, m1, m2 = magnitude[rows, k - 1], magnitude[rows, k], magnitude[rows, k + 1]
+    curvature = m0 - 2 * m1 + m2
+    offset = np.where(curvature < 0, 0.5 * (m0 - m2) / np.where(curvature < 0, curvature, -1), 0)
+    return (k + offset) / (n_fft * dt)
+
+
+# Dominant frequency of every trace from a Lomb-Scargle periodogram (non-uniform sampling):
+# The periodogram is evaluated on a frequency grid from 1/(time span) to the mean Nyquist frequency in chunks of
+# frequencies, so the (frequencies, traces, points) intermediates stay below max_elements
+def _lomb_scargle_frequencies(t, y, oversampling=5, max_elements=2**24):
+    n_traces, n_points = y.shape
+    span = np.max(t.max(axis=1) - t.min(axis=1))
+    f_min = 1 / span
+    f_max = 0.5 * (n_points - 1) / span
+    frequencies = np.arange(f_min, f_max, f_min / oversampling)
+    y = y - y.mean(axis=1, keepdims=True)
+
+    power = np.empty((frequencies.size, n_traces))
+    chunk = max(1, max_elements // (n_traces * n_points))      # Products with y are (frequencies, traces, points)
+    for start in range(0, frequencies.size, chunk):
+        omega = 2 * np.pi * frequencies[start:start + chunk, None, None]
+        omega_t = omega * t[None, :, :]     # (frequencies, 1 or traces, points)
+        tau = np.arctan2(np.sin(2 * omega_t).sum(axis=2), np.cos(2 * omega_t).sum(axis=2)) / 2
+        phase = omega_t - tau[:, :, None]
+        cos_phase, sin_phase = np.cos(phase), np.sin(phase)
+        power[start:start + chunk] = 0.5 * ((cos_phase * y).sum(axis=2)**2 / (cos_phase**2).sum(axis=2) +
+                                            (sin_phase * y).sum(axis=2)**2 / (sin_phase**2).sum(axis=2))
+
+    k = np.clip(np.argmax(power, axis=0), 1, frequencies.size - 2)
+    rows = np.arange(n_traces)
+    p0, p1, p2 = power[k - 1, rows], power[k, rows], power[k + 1, rows]
+    curvature = p0 - 2 * p1 + p2
+    offset = np.where(curvature < 0, 0.5 * (p0 - p2) / np.where(curvature < 0, curvature, -1), 0)
+    return frequencies[k] + offset * (frequencies[1] - frequencies[0])
+
+
+# Initial guess for p[0]*sin(2*pi*t/p[1] + p[2]), returns (n_traces, 3):
+def sine_initial_guess(t, y, oversampling=5, max_elements=2**24):
+    t, y, _ = _traces_first(t, y, None)
+    steps = np.diff(t, axis=1)
+    if t.shape[0] == 1 and t.shape[1] > 2 and np.allclose(steps, steps[0, 0], rtol=1e-6, atol=0):
+        frequencies = _fft_frequencies(steps[0, 0], y)
+    else:
+        frequencies = _lomb_scargle_frequencies(t, y, oversampling, max_elements)
+
+    # At a fixed frequency the model is linear: a*sin(wt) + b*cos(wt) = A*sin(wt + phi), A = |(a, b)|, phi = atan2(b, a)
+    omega_t = 2 * np.pi * frequencies[:, None] * t
+    basis = np.stack((np.sin(omega_t), np.cos(omega_t)), axis=2)    # (traces, points, 2)
+    basis = np.broadcast_to(basis, y.shape + (2,))
+    normal_matrix = basis.transpose(0, 2, 1) @ basis
+    right_hand_side = (basis.transpose(0, 2, 1) @ y[..., None])
+    normal_matrix = normal_matrix + 1e-12 * np.trace(normal_matrix, axis1=1, axis2=2)[:, None, None] * np.eye(2)
+    a, b = np.linalg.solve(normal_matrix, right_hand_side)[..., 0].T
+
+    return np.column_stack((np.hypot(a, b), 1 / frequencies, np.arctan2(b, a)))
+
+
+# Fit p[0]*sin(2*pi*t/p[1] + p[2]) to every trace:
+# p0 = None starts from sine_initial_guess(). With baseline_p0 the traces are also fitted from that guess, and the
+# result reports how many iterations and evaluations the starting point p0 (or the estimated guess) saved per trace.
+def fit_sine_batch(t, y, p0=None, sigma=None, max_iterations=100, tol=1e-10, baseline_p0=None):
+    if p0 is None:
+        p0 = sine_initial_guess(t, y)
+    result = levenberg_marquardt_batch(sine_signal_batch, sine_jacobian_batch, t, y, p0, sigma=sigma, max_iterations=max_iterations, tol=tol)
+    result["initial_parameters"] = np.array(np.broadcast_to(p0, result["parameters"].shape))
+
+    if baseline_p0 is not None:
+        baseline = levenberg_marquardt_batch(sine_signal_batch, sine_jacobian_batch, t, y, baseline_p0, sigma=sigma, max_iterations=max_iterations, tol=tol)
+        result["iterations_saved"] = baseline["iterations"] - result["iterations"]
+        result["evaluations_saved"] = baseline["evaluations"] - result["evaluations"]
+        result["baseline_converged"] = baseline["converged"]
+    return result
+
+
+
+# Linear-in-parameters models, y = sum_j p[j] * basis_j(t):
+# The Jacobian is the design matrix and does not depend on p
+def basis_model(*basis_functions):
+    def design(t):
+        return np.stack([np.broadcast_to(basis(t), t.shape) for basis in basis_functions], axis=-1)   # (1 or traces, points, k)
+
+    def function(t, p):
+        return (design(t) @ p[:, :, None])[..., 0]
+
+    def jacobian(t, p):
+        return np.broadcast_to(design(t), (p.shape[0],) + t.shape[1:] + (len(basis_functions),))
+
+    return function, jacobian
+
+
+# Polynomial p[0] + p[1]*t + ... + p[degree]*t^degree (without the constant term if constant=False):
+def polynomial_model(degree, constant=True):
+    powers = range(0 if constant else 1, degree + 1)
+    return basis_model(*[(lambda t, power=power: t**power) for power in powers])
+
+
+
+# Closed-form weighted linear least squares for a linear model given by its jacobian (design matrix):
+@instrument("fit.linear_batch")
+def fit_linear_batch(jacobian, t, y, sigma=None, n_parameters=None):
+    t, y, weights = _traces_first(t, y, sigma)
+    n_traces, n_points = y.shape
+    if n_parameters is None:
+        n_parameters = jacobian(t, np.zeros((t.shape[0], 1))).shape[-1]
+    design = jacobian(t, np.zeros((t.shape[0], n_parameters)))      # (1 or traces, points, k)
+    shared_weights = sigma is None or np.ndim(sigma) == 1
+
+    if design.shape[0] == 1 and shared_weights:
+        # One QR of the shared weighted design matrix solves every trace: p = R^-1 Q^T W y
+        weighted_design = design[0] * weights[0][:, None]
+        Q, R = np.linalg.qr(weighted_design)
+        parameters = np.linalg.solve(R, Q.T @ (y * weights[0]).T).T
+        inverse_normal_matrix = np.linalg.pinv(R.T @ R)[None, :, :]
+    else:
+        # Per-trace design or weights: one batched solve of the normal equations
+        weighted_design = np.broadcast_to(design, (n_traces, n_points, n_parameters)) * weights[..., None]
+        normal_matrix = weighted_design.transpose(0, 2, 1) @ weighted_design
+        right_hand_side = weighted_design.transpose(0, 2, 1) @ (y * weights)[..., None]
+        parameters = np.linalg.solve(normal_matrix, right_hand_side)[..., 0]
+        inverse_normal_matrix = np.linalg.pinv(normal_matrix)
+
+    residual = (y - (design @ parameters[:, :, None])[..., 0]) * weights
+    cost = np.einsum("ij,ij->i", residual, residual)
+    degrees_of_freedom = max(n_points - n_parameters, 1)
+    scale = np.ones((n_traces, 1, 1)) if sigma is not None else (cost / degrees_of_freedom)[:, None, None]
+
+    return {
+        "parameters": parameters,
+        "covariance": inverse_normal_matrix * scale,
+        "converged": np.ones(n_traces, dtype=bool),
+        "iterations": np.zeros(n_traces, dtype=np.int64),
+        "evaluations": np.zeros(n_traces, dtype=np.int64),
+        "cost": cost,
+        "linear": True,
+    }
+
+
+
+# A model is linear in its parameters if its Jacobian does not change with p and function(t, p) == J p
+def is_linear_model(function, jacobian, t, n_parameters, trials=2, seed=0):
+    t = np.asarray(t, dtype=np.float64)
+    t = t[None, :] if t.ndim == 1 else np.ascontiguousarray(t.T)
+    random_parameters = np.random.default_rng(seed).standard_normal((trials, n_parameters)) * 10
+    with np.errstate(all="ignore"):
+        jacobians = [jacobian(t, np.broadcast_to(p, (t.shape[0], n_parameters))) for p in random_parameters]
+        values = [function(t, np.broadcast_to(p, (t.shape[0], n_parameters))) for p in random_parameters]
+    for J, value, p in zip(jacobians, values, random_parameters):
+        if not np.all(np.isfinite(J)) or not np.allclose(J, jacobians[0], rtol=1e-12, atol=0):
+            return False
+        if not np.allclose(value, J @ p, rtol=1e-10, atol=1e-12 * np.abs(value).max()):
+            return False
+    return True
+
+
+
+# Generic entry point: linear models (given with linear=True, or detected) are solved in closed form,
+# anything else goes to the batched Levenberg-Marquardt engine, which needs p0
+def fit_batch(function, jacobian, t, y, p0=None, sigma=None, linear=None, n_parameters=None, max_iterations=100, tol=1e-10):
+    if n_parameters is None:
+        if p0 is None:
+            raise ValueError("n_parameters or p0 is needed to fit a model")
+        n_parameters = np.shape(p0)[-1]
+    if linear is None:
+        linear = is_linear_model(function, jacobian, t, n_parameters)
+
+    if linear:
+        return fit_linear_batch(jacobian, t, y, sigma=sigma, n_parameters=n_parameters)
+    if p0 is None:
+        raise ValueError("p0 is needed to fit a nonlinear model")
+    result = levenberg_marquardt_batch(function, jacobian, t, y, p0, sigma=sigma, max_iterations=max_iterations, tol=tol)
+    result["linear"] = False
+    return result
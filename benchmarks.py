@@ -0,0 +1,299 @@
+# Benchmarks
+
+# Timing harness for the numerical kernels of the repository, with problem sizes small/medium/large per kernel:
+#   - wall time: best and median of several repeats after a warm-up run (perf_counter)
+#   - throughput: items per second of the best run (cells, points, traces, samples, rows, ... see "unit")
+#   - peak memory: high-water mark of one extra run under tracemalloc (NumPy reports its buffers to tracemalloc)
+# Every run is appended to a JSON history file, and compared with a stored baseline: a kernel whose median time grew
+# by more than the threshold (relative) is reported as a regression and the exit status is 1
+#
+# Usage:
+#   python benchmarks.py                                  # small and medium sizes, appended to benchmark_history.json
+#   python benchmarks.py --sizes large --only quadrature fit
+#   python benchmarks.py --save-baseline                  # store this run as benchmark_baseline.json
+#   python benchmarks.py --threshold 0.2                  # fail when more than 20 % slower than the baseline
+#   results = run_benchmarks(sizes=("small",), only=("noise",))
+
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+
+size_names = ("small", "medium", "large")
+default_history_file = "benchmark_history.json"
+default_baseline_file = "benchmark_baseline.json"
+default_threshold = 0.10
+
+
+
+# Every case builds its inputs outside of the timing and returns
+#   {"run": callable, "items": work items per run, "unit": name of an item, "reset": optional callable before every run}
+
+def _nanobeam_geometry(n, workdir):
+    from nanobeam_geometry import generate_nanobeam_geometry
+    return {"run": lambda: generate_nanobeam_geometry(n, 4e-3, 400e-9, 0.15, 8, 50e-6), "items": n, "unit": "unit cells"}
+
+
+def _nanobeam_sweep(n, workdir):
+    import nanobeam_sweep
+    grid = nanobeam_sweep.parameter_grid(N_unit_cells=range(40, 40 + 2 * n, 2))
+    return {"run": lambda: nanobeam_sweep.run_sweep(grid, processes=1), "items": n, "unit": "geometries",
+            "reset": nanobeam_sweep._worker_caches.clear}     # Time the builds, not the cache lookups
+
+
+def _quadrature_simpson(n, workdir):
+    import quadrature
+    return {"run": lambda: quadrature.integrate(lambda x: np.exp(-x**2), -5, 5, method="simpson", n=n), "items": n, "unit": "points"}
+
+
+def _quadrature_batch(n, workdir):
+    import quadrature
+    upper_bounds = np.linspace(0.5, 5, n)
+    return {"run": lambda: quadrature.integrate_batch(lambda x: np.exp(-x**2), -5, upper_bounds, n=40), "items": n, "unit": "integrals"}
+
+
+def _convergence_study(levels, workdir):
+    import quadrature
+    return {"run": lambda: quadrature.convergence_study(lambda x: np.exp(-x**2), -5, 5, levels=levels, reference=np.pi**0.5),
+            "items": 2**levels, "unit": "points"}
+
+
+def _sine_fit(n, workdir):
+    from batch_fitting import fit_sine_batch
+    rng = np.random.default_rng(0)
+    t = np.linspace(0, 20, 80)
+    y = 3.0 * np.sin(2 * np.pi * t[:, None] / rng.uniform(4, 8, n) - np.pi / 6) + 0.6 * rng.standard_normal((t.size, n))
+    return {"run": lambda: fit_sine_batch(t, y), "items": n, "unit": "traces"}
+
+
+def _linear_fit(n, workdir):
+    from batch_fitting import basis_model, fit_batch
+    rng = np.random.default_rng(0)
+    t = np.linspace(0, 20, 100)
+    y = 9.81 * t[:, None] * (1 + 0.1 * rng.standard_normal((t.size, n)))
+    function, jacobian = basis_model(lambda t: t)
+    return {"run": lambda: fit_batch(function, jacobian, t, y, linear=True, n_parameters=1), "items": n, "unit": "traces"}
+
+
+def _exponential_noise(n, workdir):
+    from noise_generation import exponential_kernel_noise
+    white = np.random.default_rng(0).standard_normal(n)
+    return {"run": lambda: exponential_kernel_noise(white, 0.001, tau=0.05, gain=10, taps=1000), "items": n, "unit": "samples"}
+
+
+def _oscillator_ensemble(n, workdir):
+    from oscillator_ensemble import simulate_ensemble
+    t = np.arange(0, 1, 0.001)
+    return {"run": lambda: simulate_ensemble(n, t, seed=1, processes=1), "items": n * t.size, "unit": "samples"}
+
+
+def _rk4(n, workdir):
+    from ode_integration import rk4, oscillator_rhs, natural_frequency
+    t = np.linspace(0, 1, 1001)
+    rhs = oscillator_rhs(1.0, natural_frequency(1.0, np.linspace(1, 10, n)))
+    y0 = np.column_stack((np.zeros(n), np.ones(n)))
+    return {"run": lambda: rk4(rhs, y0, t, decimate=10), "items": n * (t.size - 1), "unit": "oscillator steps"}
+
+
+def _write_csv(n, workdir):
+    file_name = os.path.join(workdir, "benchmark_" + str(n) + ".csv")
+    if not os.path.exists(file_name):
+        values = np.random.default_rng(0).normal(0, 0.3, (n, 2))
+        np.savetxt(file_name, values, delimiter=",", header="uniform,normal", comments="", fmt="%.17g")
+    return file_name
+
+
+def _csv_statistics(n, workdir):
+    from streaming_statistics import csv_statistics
+    file_name = _write_csv(n, workdir)
+    return {"run": lambda: csv_statistics(file_name, column="normal", bins=np.linspace(-1, 1, 101)), "items": n, "unit": "rows"}
+
+
+def _parallel_csv_statistics(n, workdir):
+    from parallel_csv import parallel_csv_statistics
+    file_name = _write_csv(n, workdir)
+    return {"run": lambda: parallel_csv_statistics(file_name, column="normal", bins=np.linspace(-1, 1, 101)), "items": n, "unit": "rows"}
+
+
+def _divisor_classification(n, workdir):
+    from proper_divisors import classification_counts
+    return {"run": lambda: classification_counts(n), "items": n, "unit": "numbers"}
+
+
+def _base_conversion(n, workdir):
+    from number_base_conversions import to_strings, from_strings
+    values = np.random.default_rng(0).integers(0, 2**63, n, dtype=np.int64)
+    return {"run": lambda: from_strings(to_strings(values, base=16), base=16), "items": n, "unit": "values"}
+
+
+# name: (case, sizes for small, medium, large)
+benchmark_cases = {
+    "nanobeam_geometry": (_nanobeam_geometry, (100, 10**4, 10**6)),
+    "nanobeam_sweep": (_nanobeam_sweep, (10, 100, 1000)),
+    "quadrature_simpson": (_quadrature_simpson, (10**4, 10**6, 10**7)),
+    "quadrature_batch": (_quadrature_batch, (100, 10**4, 10**5)),
+    "convergence_study": (_convergence_study, (12, 16, 20)),
+    "sine_fit": (_sine_fit, (10, 1000, 10**4)),
+    "linear_fit": (_linear_fit, (10, 10**4, 10**5)),
+    "exponential_noise": (_exponential_noise, (10**4, 10**6, 10**7)),
+    "oscillator_ensemble": (_oscillator_ensemble, (16, 256, 4096)),
+    "rk4": (_rk4, (10, 1000, 10**5)),
+    "csv_statistics": (_csv_statistics, (10**4, 10**6, 10**7)),
+    "parallel_csv_statistics": (_parallel_csv_statistics, (10**4, 10**6, 10**7)),
+    "divisor_classification": (_divisor_classification, (10**4, 10**6, 10**7)),
+    "base_conversion": (_base_conversion, (10**3, 10**5, 10**6)),
+}
+
+
+
+def measure(case, repeats=5, warmup=1):
+    reset = case.get("reset", lambda: None)
+    for _ in range(warmup):
+        reset()
+        case["run"]()
+
+    times = []
+    for _ in range(repeats):
+        reset()
+        start = time.perf_counter()
+        case["run"]()
+        times.append(time.perf_counter() - start)
+
+    reset()
+    tracemalloc.start()
+    try:
+        case["run"]()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    best = min(times)
+    return {
+        "items": case["items"],
+        "unit": case["unit"],
+        "repeats": repeats,
+        "best_s": best,
+        "median_s": statistics.median(times),
+        "throughput": case["items"] / best if best > 0 else float("inf"),
+        "peak_memory_bytes": peak_memory,
+    }
+
+
+
+# Results keyed "name[size]", names are selected by substring with only:
+def run_benchmarks(sizes=("small", "medium"), only=None, repeats=5, verbose=False):
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, (case, case_sizes) in benchmark_cases.items():
+            if only and not any(pattern in name for pattern in only):
+                continue
+            for size in sizes:
+                n = case_sizes[size_names.index(size)]
+                result = measure(case(n, workdir), repeats)
+                result["size"] = n
+                results[name + "[" + size + "]"] = result
+                if verbose:
+                    print(_format_result(name + "[" + size + "]", result))
+    return results
+
+
+def _format_result(key, result):
+    return "%-36s %10.4f s  %12.4g %s/s  %10.1f MB" % (key, result["median_s"], result["throughput"], result["unit"],
+                                                      result["peak_memory_bytes"] / 2**20)
+
+
+def run_record(results):
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+
+
+
+def load_json(file_name, default=None):
+    if not os.path.exists(file_name):
+        return default
+    with open(file_name) as file:
+        return json.load(file)
+
+
+def save_json(file_name, data):
+    temporary_name = file_name + ".tmp"
+    with open(temporary_name, "w") as file:
+        json.dump(data, file, indent=1)
+    os.replace(temporary_name, file_name)
+
+
+def append_history(file_name, record):
+    history = load_json(file_name, default=[])
+    history.append(record)
+    save_json(file_name, history)
+    return history
+
+
+
+# Kernels whose median time grew by more than threshold relative to the baseline: [(key, baseline_s, current_s), ...]
+def compare_to_baseline(results, baseline, threshold=default_threshold):
+    regressions = []
+    for key, result in results.items():
+        reference = baseline["results"].get(key)
+        if reference is None or reference["size"] != result["size"]:
+            continue
+        if result["median_s"] > (1 + threshold) * reference["median_s"]:
+            regressions.append((key, reference["median_s"], result["median_s"]))
+    return regressions
+
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of the numerical kernels")
+    parser.add_argument("--sizes", nargs="+", choices=size_names, default=["small", "medium"])
+    parser.add_argument("--only", nargs="+", help="run the benchmarks whose name contains one of these strings")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--history", default=default_history_file)
+    parser.add_argument("--baseline", default=default_baseline_file)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--threshold", type=float, default=default_threshold, help="allowed relative slowdown")
+    parser.add_argument("--list", action="store_true", help="list the benchmarks and their sizes")
+    arguments = parser.parse_args(argv)
+
+    if arguments.list:
+        for name, (_, case_sizes) in benchmark_cases.items():
+            print(name, dict(zip(size_names, case_sizes)))
+        return 0
+
+    results = run_benchmarks(arguments.sizes, arguments.only, arguments.repeats, verbose=True)
+    record = run_record(results)
+    append_history(arguments.history, record)
+
+    baseline = load_json(arguments.baseline)
+    status = 0
+    if baseline is not None and not arguments.save_baseline:
+        regressions = compare_to_baseline(results, baseline, arguments.threshold)
+        for key, baseline_time, current_time in regressions:
+            print("REGRESSION %s: %.4f s -> %.4f s (%+.0f %%)" % (key, baseline_time, current_time, 100 * (current_time / baseline_time - 1)))
+        if regressions:
+            status = 1
+        else:
+            print("No regressions above %.0f %% against %s" % (100 * arguments.threshold, arguments.baseline))
+    if arguments.save_baseline:
+        save_json(arguments.baseline, record)
+        print("Baseline saved to", arguments.baseline)
+    return status
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
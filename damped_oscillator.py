@@ -1,29 +1,16 @@
-from matplotlib import pyplot
 import numpy as np
-from scipy import signal
-import csv
-import math
-import pandas
+from noise_generation import exponential_kernel_noise
+from ode_integration import rk4, oscillator_rhs, sampled_force, natural_frequency
+from plotting import renderer_from_arguments
 
 
 dt = 0.001
-t1 = np.arange(0.0, 10.0, dt)
-r = np.exp(-t1[:1000]/0.05)               # impulse response
-x = np.random.randn(len(t1))
-s = 10*np.convolve(x, r)[:len(x)]*dt  # colored noise
-
-
-t = np.arange(0., 10., 0.02)
 x0 = 1
 damp_rate = 1
 omega = 5
 
-x = np.arange(0., 10., 0.2)
-def x(t):
-    if(t.any() > 0):
-        return (x0)*np.exp(-.5*(damp_rate)*t)*np.sin(omega*t)
-    else:
-        return 0
+def x(t):     # Zero before the impulse at t = 0
+    return np.where(t > 0, (x0)*np.exp(-.5*(damp_rate)*t)*np.sin(omega*t), 0)
 
 def envelope(t):
     return np.exp(-(damp_rate)*t/2)
@@ -32,10 +19,7 @@ def return_zero(t):
     return 0*t
 
 def dirac_delta(t):
-    if(t.any==0):
-        return 1
-    else:
-        return 0
+    return np.where(t == 0, 1, 0)
 
 def deltagauss(x,b,sigma):
     arg=(-x**2/(2*sigma**2))
@@ -44,36 +28,56 @@ def deltagauss(x,b,sigma):
     delta=num/den
     return delta
 
-# Main Plot of oscillator
-pyplot.plot (t1,x(t1) + s, 'b-', t, envelope(t), 'g--', t, -envelope(t), 'g--')
-pyplot.ylabel('x(t) [A.U.]')
-pyplot.xlabel('t [s]')
-pyplot.title('Damped Mechanical Oscillator with Gaussian Noise')
-pyplot.annotate(r'$e^{\frac{-\Gamma_{m}}{2}t}$', xy = (2, 1), xytext=(2, 0.5), color='g').set_fontsize(20)
-pyplot.annotate(r'$x(t) = x_{0} e^{\frac{-\Gamma_{m}}{2}t} sin(\Omega_{m}t)$', xy = (4, -0.75), xytext=(4, -1.00)).set_fontsize(20)
-pyplot.annotate(r'$\Gamma_{m} = 1$', xy = (1, 1), xytext=(4, 0.85)).set_fontsize(12)
-pyplot.annotate(r'$\Omega_{m} = 5$', xy = (1, 1), xytext=(4, 0.65)).set_fontsize(12)
-
-
-
-# Embedded axis plot of impulse force
-a = pyplot.axes([.725, .67, .2, .2])
-# pyplot.plot(return_zero(t), 'r--')
-pyplot.title('Impulse Force')
-pyplot.ylabel('F(t) [A.U.]')
-pyplot.xlabel('t [s]')
-pyplot.xlim(-1, 1)
-pyplot.ylim(-3,40)
-#pyplot.xticks([])
-pyplot.yticks([0],[])
-# pyplot.axhline(y=0, color='k')
-# pyplot.axvline(x=0, color='k')
-impulse_x = np.linspace(-1,1,200)
-impulse_y = deltagauss(impulse_x, 0, 0.01)
-a.plot(impulse_x, impulse_y, 'r')
-
-
-pyplot.show()
+def main(renderer):
+    pyplot = renderer.pyplot
+
+    t1 = np.arange(0.0, 10.0, dt)
+    white = np.random.randn(len(t1))
+    s = exponential_kernel_noise(white, dt, tau=0.05, gain=10, taps=1000)  # colored noise, 10*np.convolve(white, exp(-t1[:1000]/0.05))[:len(white)]*dt as a one-pole IIR filter
+
+    t = np.arange(0., 10., 0.02)
+
+    # Numerical check (ode_integration.py): the Gaussian impulse of strength x0*omega drives the same response as x(t)
+    impulse_t = np.arange(-0.1, 10.0, dt)
+    impulse_force = x0 * omega * deltagauss(impulse_t, 0, 0.005)
+    impulse_response = rk4(oscillator_rhs(damp_rate, natural_frequency(damp_rate, omega), force=sampled_force(impulse_t, impulse_force)),
+                           np.zeros((1, 2)), impulse_t)[:, 0, 0]
+    print("Max |RK4 impulse response - x(t)| after the impulse:", np.abs(impulse_response - x(impulse_t))[impulse_t > 0.05].max())
+
+    # Main Plot of oscillator
+    pyplot.plot (t1,x(t1) + s, 'b-', t, envelope(t), 'g--', t, -envelope(t), 'g--')
+    pyplot.ylabel('x(t) [A.U.]')
+    pyplot.xlabel('t [s]')
+    pyplot.title('Damped Mechanical Oscillator with Gaussian Noise')
+    pyplot.annotate(r'$e^{\frac{-\Gamma_{m}}{2}t}$', xy = (2, 1), xytext=(2, 0.5), color='g').set_fontsize(20)
+    pyplot.annotate(r'$x(t) = x_{0} e^{\frac{-\Gamma_{m}}{2}t} sin(\Omega_{m}t)$', xy = (4, -0.75), xytext=(4, -1.00)).set_fontsize(20)
+    pyplot.annotate(r'$\Gamma_{m} = 1$', xy = (1, 1), xytext=(4, 0.85)).set_fontsize(12)
+    pyplot.annotate(r'$\Omega_{m} = 5$', xy = (1, 1), xytext=(4, 0.65)).set_fontsize(12)
+
+
+
+    # Embedded axis plot of impulse force
+    a = pyplot.axes([.725, .67, .2, .2])
+    # pyplot.plot(return_zero(t), 'r--')
+    pyplot.title('Impulse Force')
+    pyplot.ylabel('F(t) [A.U.]')
+    pyplot.xlabel('t [s]')
+    pyplot.xlim(-1, 1)
+    pyplot.ylim(-3,40)
+    #pyplot.xticks([])
+    pyplot.yticks([0],[])
+    # pyplot.axhline(y=0, color='k')
+    # pyplot.axvline(x=0, color='k')
+    impulse_x = np.linspace(-1,1,200)
+    impulse_y = deltagauss(impulse_x, 0, 0.01)
+    a.plot(impulse_x, impulse_y, 'r')
+
+
+    renderer.save("damped_oscillator")
+
+
+if __name__ == "__main__":
+    main(renderer_from_arguments())
 
 
 
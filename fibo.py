@@ -1,133 +1,103 @@
-from matplotlib import pyplot
 import numpy as np
-import csv
-import math
-import pandas
+from streaming_statistics import csv_statistics
+from streaming_histogram import Histogram, plot_histogram
+from plotting import renderer_from_arguments
 
 
-t = np.arange(0., 10., 0.02)
 x0 = 1
 damp_rate = 1
 omega = 50
 
-x = np.arange(0., 10., 0.2)
 def x(t):
     return (x0)*np.exp(-.5*(damp_rate)*t)*np.sin(omega*t)
 
-pyplot.plot (t,x(t), 'bo')
-pyplot.ylabel('x(t)')
-pyplot.xlabel('t')
-pyplot.title('Mechanical Oscillator')
-pyplot.show()
 
+def main(renderer):
+    pyplot = renderer.pyplot
+    t = np.arange(0., 10., 0.02)
+    pyplot.plot (t,x(t), 'bo')
+    pyplot.ylabel('x(t)')
+    pyplot.xlabel('t')
+    pyplot.title('Mechanical Oscillator')
+    renderer.save("oscillator")
 
-print("Hi")
-i = 15
-while(i>10):
-    i-=1
-    print(i)
 
-# random plot
-x = [1, 2, 3, 4, 5, 6, 7]
-y = [1, 2, 3, 4, 5, 6, 7]
-pyplot.plot(x,y)
-pyplot.ylabel('some numbers')
-pyplot.title('A graph')
-pyplot.show()
+    print("Hi")
+    i = 15
+    while(i>10):
+        i-=1
+        print(i)
 
-# evenly sampled time at 200ms intervals
-t = np.arange(0., 5., 0.2)
+    # random plot
+    x_data = [1, 2, 3, 4, 5, 6, 7]
+    y_data = [1, 2, 3, 4, 5, 6, 7]
+    pyplot.plot(x_data,y_data)
+    pyplot.ylabel('some numbers')
+    pyplot.title('A graph')
+    renderer.save("line")
 
-# red dashes, blue squares and green triangles
-pyplot.plot(t, t, 'r--', t, t**2, 'bs', t, t**3, 'g^')
-pyplot.show()
+    # evenly sampled time at 200ms intervals
+    t = np.arange(0., 5., 0.2)
 
+    # red dashes, blue squares and green triangles
+    pyplot.plot(t, t, 'r--', t, t**2, 'bs', t, t**3, 'g^')
+    renderer.save("powers")
 
-# histogram
-mu, sigma = 100, 15
-x = mu + sigma * np.random.randn(10000) #generates Gaussian data
 
-# the histogram of the data
-n, bins, patches = pyplot.hist(x, 50, density=1, facecolor='g', alpha=0.75)
+    # histogram
+    mu, sigma = 100, 15
 
-
-pyplot.xlabel('Smarts')
-pyplot.ylabel('Probability')
-pyplot.title('Histogram of IQ')
-pyplot.text(60, .025, r'$\mu=100,\ \sigma=15$')
-pyplot.axis([40, 160, 0, 0.03])
-pyplot.grid(True)
-pyplot.show()
-
-# This is to get the current working directory
-import os
-cwd = os.getcwd()  # Get the current working directory (cwd)
-files = os.listdir(cwd)  # Get all the files in that directory
-print("Files in '%s': %s" % (cwd, files))
+    # the histogram of the data, accumulated chunk by chunk (streaming_histogram.py), so the samples are never all in memory
+    iq_histogram = Histogram(50, range=(40, 160))
+    for _ in range(10):
+        iq_histogram.update(mu + sigma * np.random.randn(1000)) #generates Gaussian data
+    plot_histogram(iq_histogram, ax=pyplot.gca(), density=True, facecolor='g', alpha=0.75)
 
 
+    pyplot.xlabel('Smarts')
+    pyplot.ylabel('Probability')
+    pyplot.title('Histogram of IQ')
+    pyplot.text(60, .025, r'$\mu=100,\ \sigma=15$')
+    pyplot.axis([40, 160, 0, 0.03])
+    pyplot.grid(True)
+    renderer.save("iq_histogram")
 
+    # This is to get the current working directory
+    import os
+    cwd = os.getcwd()  # Get the current working directory (cwd)
+    files = os.listdir(cwd)  # Get all the files in that directory
+    print("Files in '%s': %s" % (cwd, files))
 
 
 
-# CSV stuff
 
-# Another way to tell the open() function where your file is located is by using an absolute path, e.g.:
-# f = open("/Users/foo/address.csv")
 
-with open("random_data.csv") as file:
-    reader = csv.reader(file)
 
-    count = 0
+    # CSV stuff
 
-    # the histogram of the data from the csv file
-    # for rows in reader:
-    #     pyplot.hist(rows[0], 50, density=1, facecolor='g', alpha=0.75)
+    # Another way to tell the open() function where your file is located is by using an absolute path, e.g.:
+    # f = open("/Users/foo/address.csv")
 
-    sigma_accum = 0
-    mu_accum = 0
-    for rows in reader:
-        if (rows[0] != 'normal'):
-            # print(rows[0])        #prints numbers
-            #print(type(rows[0]))   #<class 'str'>
-            mu_accum += float(rows[0])
-    print("mu_accum", mu_accum)
-    mu = mu_accum/100
+    # One pass over the file in large chunks (streaming_statistics.py): count, mean, variance, min/max and the histogram together
+    csv_stats = csv_statistics("random_data.csv", column="normal", bins=np.linspace(-1, 1, 101))
+    mu = csv_stats.mean
+    sigma = csv_stats.std
+    print("count", csv_stats.count)
     print("mu:", mu)
-
-    print("count", count)
-    count = 0
-    rows = 0
-
-    sigma_accum = 0
-    for rows in reader:
-        if (rows[0] != 'normal'):
-            sigma_accum += (float(rows[0]) - mu)**2
-            print("test:", sigma_accum)
-
-    print("sigma_accum:", sigma_accum)
-    sigma = math.sqrt((sigma_accum/100))
     print("sigma:", sigma)
+    print("min, max:", csv_stats.min, csv_stats.max)
 
-#todo
-    # why is sigma_accum giving 0?? sketchy...
-    # because of initialization
-    # for some reason not iterating through reader second time...
-
-
-    # mu, sigma = 0, .1
-    for rows in reader:
-        if(rows[0] != 'normal'):
-            x = mu + sigma * float(np.array(rows[0]))
-
-    pyplot.hist(x, 100, density=1, facecolor='b', alpha=0.75)
+    # the histogram of the data from the csv file, from the precomputed bin counts
+    pyplot.stairs(csv_stats.histogram_density(), csv_stats.bin_edges, fill=True, facecolor='b', alpha=0.75)
 
     pyplot.xlabel('Data')
     pyplot.ylabel('Probability')
     pyplot.title('Histogram of Random Data')
-    pyplot.text(-.75, .25, r'$\mu=-0.005,\ \sigma=0$')
-    pyplot.axis([-1, 1, 0, 0.3])
+    pyplot.text(-.75, .25, r'$\mu=%.3f,\ \sigma=%.3f$' % (mu, sigma))
+    pyplot.xlim(-1, 1)
     pyplot.grid(True)
-    pyplot.show()
+    renderer.save("csv_histogram")
 
 
+if __name__ == "__main__":
+    main(renderer_from_arguments())
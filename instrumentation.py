@@ -0,0 +1,191 @@
+# Instrumentation
+
+# Lightweight tracing of the compute kernels: per-stage timers, call counts, array sizes, event counters and
+# allocation high-water marks, dumped as JSON or in the Chrome trace format (chrome://tracing, ui.perfetto.dev)
+#   - stage(name, **fields) is a context manager and instrument(name) a decorator; array fields are recorded as
+#     shape and nbytes
+#   - count(name, n) adds to a counter, e.g. the number of function evaluations of a fit or the rows of a CSV file
+# Disabled (the default) every hook is a check of one global flag, stage() returns a shared do-nothing context and
+# nothing is recorded, so the hooks can stay in the kernels. Hooks are placed around array operations, not per element.
+# With enable(memory=True) tracemalloc runs and every stage records its allocation high-water mark (peak traced
+# memory while it was open, above the memory in use when it was entered)
+# Only the process that calls enable() is traced; process pool workers are not
+#
+# Usage:
+#   instrumentation.enable(memory=True)
+#   fit = fit_sine_batch(t, y)
+#   instrumentation.summary()["counters"]["fit.function_evaluations"]
+#   instrumentation.write_chrome_trace("trace.json")      # or write_json("trace.json")
+#   instrumentation.disable()
+#   INSTRUMENTATION_TRACE=trace.json python nanobeam_parameters.py      # Whole script, Chrome trace written at exit
+
+
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+
+_enabled = False
+_memory = False
+_started_tracemalloc = False
+_start = 0.0
+_events = []            # Chrome trace "complete" events
+_counters = {}
+_counter_events = []
+_stack = []             # Open stages, for the peak memory of nested stages
+
+
+
+def enable(memory=False):
+    global _enabled, _memory, _start, _started_tracemalloc
+    reset()
+    _start = time.perf_counter()
+    _memory = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _started_tracemalloc = True
+    _enabled = True
+
+
+def disable():
+    global _enabled, _started_tracemalloc
+    _enabled = False
+    if _started_tracemalloc:
+        tracemalloc.stop()
+        _started_tracemalloc = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    _events.clear()
+    _counters.clear()
+    _counter_events.clear()
+    _stack.clear()
+
+
+
+def _describe(value):
+    if hasattr(value, "shape") and hasattr(value, "nbytes"):
+        return {"shape": list(value.shape), "nbytes": int(value.nbytes)}
+    if isinstance(value, (bool, int, float, str)) or value is None:
+        return value
+    return repr(value)
+
+
+def _timestamp():      # Microseconds since enable()
+    return (time.perf_counter() - _start) * 1e6
+
+
+
+class _Stage:
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+        self.child_peak = 0     # Absolute traced peaks of nested stages, which reset the tracemalloc peak
+
+    def __enter__(self):
+        if _memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if _stack:      # The parent's peak so far, before it is reset for this stage
+                _stack[-1].child_peak = max(_stack[-1].child_peak, peak)
+            self.base = current
+            tracemalloc.reset_peak()
+        _stack.append(self)
+        self.begin = _timestamp()
+        return self
+
+    def __exit__(self, *exception):
+        end = _timestamp()
+        _stack.pop()
+        args = {key: _describe(value) for key, value in self.fields.items()}
+        if _memory:
+            peak = max(tracemalloc.get_traced_memory()[1], self.child_peak)
+            args["peak_memory_bytes"] = peak - self.base     # High-water mark of the memory allocated in the stage
+            if _stack:
+                _stack[-1].child_peak = max(_stack[-1].child_peak, peak)
+        _events.append({"name": self.name, "ph": "X", "ts": self.begin, "dur": end - self.begin,
+                        "pid": os.getpid(), "tid": threading.get_ident(), "args": args})
+        return False
+
+    # Fields only known inside the stage, e.g. the size of a result:
+    def record(self, **fields):
+        self.fields.update(fields)
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        return False
+
+    def record(self, **fields):
+        pass
+
+
+_null_stage = _NullStage()
+
+
+
+def stage(name, **fields):
+    return _Stage(name, fields) if _enabled else _null_stage
+
+
+def instrument(name=None):
+    def decorator(function):
+        stage_name = name or function.__module__ + "." + function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _Stage(stage_name, {}):
+                return function(*args, **kwargs)
+
+        return wrapper
+    return decorator
+
+
+def count(name, n=1):
+    if not _enabled:
+        return
+    _counters[name] = _counters.get(name, 0) + int(n)
+    _counter_events.append({"name": name, "ph": "C", "ts": _timestamp(), "pid": os.getpid(), "args": {name: _counters[name]}})
+
+
+
+# Per stage name: calls, total and maximum time [s], largest peak memory; and the counters
+def summary():
+    stages = {}
+    for event in _events:
+        entry = stages.setdefault(event["name"], {"calls": 0, "total_s": 0.0, "max_s": 0.0})
+        entry["calls"] += 1
+        entry["total_s"] += event["dur"] * 1e-6
+        entry["max_s"] = max(entry["max_s"], event["dur"] * 1e-6)
+        if "peak_memory_bytes" in event["args"]:
+            entry["peak_memory_bytes"] = max(entry.get("peak_memory_bytes", 0), event["args"]["peak_memory_bytes"])
+    return {"stages": stages, "counters": dict(_counters)}
+
+
+def write_json(file_name):
+    with open(file_name, "w") as file:
+        json.dump(dict(summary(), events=_events), file, indent=1)
+
+
+def write_chrome_trace(file_name):
+    with open(file_name, "w") as file:
+        json.dump({"traceEvents": _events + _counter_events, "displayTimeUnit": "ms"}, file)
+
+
+
+# INSTRUMENTATION_TRACE=<file> traces a whole run from the first import on, INSTRUMENTATION_MEMORY=1 adds memory:
+if os.environ.get("INSTRUMENTATION_TRACE"):
+    enable(memory=os.environ.get("INSTRUMENTATION_MEMORY") == "1")
+    atexit.register(write_chrome_trace, os.environ["INSTRUMENTATION_TRACE"])
@@ -1,87 +1,101 @@
-from scipy.integrate import *
 import math
 import numpy as np
-from pylab import *
-import matplotlib.pyplot as plt
+import quadrature
+from plotting import renderer_from_arguments
 
 # Function to integrate
-function_map = lambda x: math.exp(-x**2)
+function_map = lambda x: math.exp(-x**2)   # Scalar version, for scipy's quad
 
 def function(x):
-    return math.exp(-x**2)
-
-def integrate(function, time, dt):
-    for t in np.nditer(time):
-        accum = dt * function
-    return accum
-
-# Integration bounds
-lower_bound = -5
-upper_bound = 5
-number_of_points = 500
-
-# Differential time element
-t = np.linspace(lower_bound, upper_bound, num = number_of_points)
-dt = t[1] - t[0]
-# print("dt:", dt)
-
-# Scipy integration method
-scipy_result = quad(function_map, lower_bound, upper_bound)
-print("Scipy Result\n Value, Error:", scipy_result)
-
-# My integration method
-f1 = np.vectorize(function)
-my_result = integrate(f1(t), t, dt)
-integrated_value = 0
-for element in my_result:
-    integrated_value += element
-
-# print(my_result)
-print("\nMy result:", integrated_value)
-
-error = abs(scipy_result[0] - integrated_value)
-print("\nScipy result - my result:", error)
-
-# print((pi)**0.5)      # Exact value
-
-# Plotting function
-plt.plot(t, f1(t), 'r--')
-plt.fill_between(t, f1(t), facecolor = 'blue', alpha = 1)
-xlabel('$x$')
-ylabel('$f(x)$')
-plt.grid()
-title('$e^{-x^2}$')
-plt.show()
-
-error_ydata = []
-index = []
-convergence_n = 52
-# Convergence plot error data generation
-for n in range(2,convergence_n):
-    index += [n]
-    integrated_value2 = 0
-    integral_value = 0
-    number_of_points = n
-    t2 = np.linspace(lower_bound, upper_bound, num=number_of_points)
-    dt2 = t2[1] - t2[0]
-    f2 = np.vectorize(function)
-    my_result2 = integrate(f2(t2), t2, dt2)
-    for elements in my_result2:
-        integrated_value2 += elements
-        integral_value += elements
-    error_ydata += [integrated_value2]
-
-# Compute best value error:
-best_error = abs(error_ydata[-1] - (pi**0.5))
-print("\nBest error from my method:", best_error, 'N,', convergence_n)
-print("Best value:", integrated_value, 'N:', convergence_n )
-
-
-# Convergence plot
-plt.plot(index, error_ydata, 'b--')
-plt.axhline(y=pi**0.5, color='r', linestyle='-')
-plt.title("Convergence plot of methods")
-xlabel('$N$ (Number of time partitions)')
-ylabel('$\int f(x) dx$')
-legend(('My method convergence values', 'Exact solution, $\pi^{1/2}$'), loc='best')
-plt.show()
+    return np.exp(-x**2)    # ufunc-style, evaluates a whole grid in one call
+
+def integrate(function, time, dt):     # Rectangle sum of the sampled function values over the grid
+    return dt * np.sum(function)
+
+
+def main(renderer):
+    from scipy.integrate import quad     # scipy only for the reference values
+    plt = renderer.pyplot
+
+    # Integration bounds
+    lower_bound = -5
+    upper_bound = 5
+    number_of_points = 500
+
+    # Differential time element
+    t = np.linspace(lower_bound, upper_bound, num = number_of_points)
+    dt = t[1] - t[0]
+    # print("dt:", dt)
+
+    # Scipy integration method
+    scipy_result = quad(function_map, lower_bound, upper_bound)
+    print("Scipy Result\n Value, Error:", scipy_result)
+
+    # My integration method
+    f1 = function
+    integrated_value = integrate(f1(t), t, dt)
+
+    # print(my_result)
+    print("\nMy result:", integrated_value)
+
+    error = abs(scipy_result[0] - integrated_value)
+    print("\nScipy result - my result:", error)
+
+    # Vectorized quadrature rules (quadrature.py), value and error estimate
+    for method, options in [("rectangle", {"n": number_of_points}), ("trapezoid", {"n": number_of_points}), ("simpson", {"n": number_of_points}),
+                            ("romberg", {"levels": 9}), ("gauss_legendre", {"n": 20, "panels": 10})]:
+        quadrature_result = quadrature.integrate(function, lower_bound, upper_bound, method=method, **options)
+        print(method, "\n Value, Error:", quadrature_result, "\n Scipy result - value:", abs(scipy_result[0] - quadrature_result[0]))
+
+    # Adaptive quadrature (quadrature.py): intervals are split only where the error estimate is above the tolerance
+    scipy_full_output = quad(function_map, lower_bound, upper_bound, full_output=1)
+    print("\nEvaluations, quad:", scipy_full_output[2]["neval"], " uniform grid:", number_of_points)
+    for name, rule in [("Adaptive Gauss-Kronrod", quadrature.adaptive_gauss_kronrod), ("Adaptive Simpson", quadrature.adaptive_simpson)]:
+        adaptive_value, adaptive_error, adaptive_info = rule(function, lower_bound, upper_bound, tol=1e-10, full_output=True)
+        print(name, "\n Value, Error:", (adaptive_value, adaptive_error), "\n Scipy result - value:", abs(scipy_result[0] - adaptive_value))
+        print(" Evaluations:", adaptive_info["evaluations"], " intervals:", adaptive_info["intervals"])
+
+    # Batched integration (quadrature.py): the same integrand over many interval pairs in one array computation
+    batch_upper_bounds = np.linspace(0.5, upper_bound, 1000)
+    batch_values, batch_errors = quadrature.integrate_batch(function, lower_bound, batch_upper_bounds, n=40)
+    print("\nBatched integrals over", batch_upper_bounds.size, "intervals, last value:", batch_values[-1], "max error estimate:", batch_errors.max())
+
+    # print((np.pi)**0.5)      # Exact value
+
+    # Plotting function
+    plt.plot(t, f1(t), 'r--')
+    plt.fill_between(t, f1(t), facecolor = 'blue', alpha = 1)
+    plt.xlabel('$x$')
+    plt.ylabel('$f(x)$')
+    plt.grid()
+    plt.title('$e^{-x^2}$')
+    renderer.save("integrand")
+
+    # Convergence study on nested grids (quadrature.py): every level doubles N and reuses all of the previous evaluations,
+    # with Richardson extrapolation of the levels, so the total cost is linear in the finest N
+    convergence_levels = 20     # Finest grid has 2**20 partitions
+    study = quadrature.convergence_study(function, lower_bound, upper_bound, levels=convergence_levels, reference=np.pi**0.5)
+    index = study["panels"]
+    error_ydata = study["trapezoid_error"]
+
+    for k in range(0, convergence_levels + 1):
+        print("N:", index[k], " evaluations:", study["evaluations"][k], " error:", study["trapezoid_error"][k], " Richardson error:", study["richardson_error"][k])
+
+    # Compute best value error:
+    best_error = error_ydata[-1]
+    print("\nBest error from my method:", best_error, 'N,', index[-1])
+    print("Best value:", study["trapezoid"][-1], 'N:', index[-1])
+
+
+    # Convergence plot
+    plt.loglog(index, study["trapezoid_error"], 'b--')
+    plt.loglog(index, study["richardson_error"], 'g-.')
+    plt.title("Convergence plot of methods")
+    plt.xlabel('$N$ (Number of time partitions)')
+    plt.ylabel(r'$|\int f(x) dx - \pi^{1/2}|$')
+    plt.legend(('Trapezoid (nested grids)', 'Richardson extrapolation'), loc='best')
+    renderer.save("convergence")
+
+
+if __name__ == "__main__":
+    main(renderer_from_arguments())
@@ -0,0 +1,241 @@
+# Nanobeam Geometry Cache
+
+# Memoizes the geometry generated by nanobeam_geometry.py
+#   - width profiles are keyed by (N_unit_cells, beam_width_narrowest, alpha_width, i_0), so sweeps that only vary
+#     L_d or beam_length reuse the same widths
+#   - full geometries (lengths and positions) are keyed by the full parameter tuple
+# Both live in an in-process LRU that evicts the least recently used entries once the stored arrays exceed max_bytes
+# An optional on-disk cache stores each entry as a .npz file named by the SHA-256 of its key (content addressed),
+# so repeated and overlapping sweeps reuse work across runs and processes
+# Cached arrays are read-only, copy them before modifying
+#
+# Usage:
+#   cache = GeometryCache(max_bytes=256 * 2**20, cache_dir="nanobeam_cache")
+#   geometry = cache.geometry(N_unit_cells, beam_length, beam_width_narrowest, alpha_width, i_0, L_d)
+#   print(cache.stats())
+
+
+import hashlib
+import os
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+from nanobeam_geometry import unitcell_widths, unitcell_lengths, unitcell_positions
+
+
+default_max_bytes = 256 * 2**20     # 256 MiB of cached arrays
+
+
+
+# Least recently used cache with eviction based on the total size of the stored arrays:
+# on_evict(key, value) is called for every entry evicted to make room
+class LRUCache:
+    def __init__(self, max_bytes=default_max_bytes, on_evict=None):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.on_evict = on_evict
+        self._entries = OrderedDict()   # key -> (value, nbytes), oldest first
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, value, nbytes):
+        if nbytes > self.max_bytes:     # Would evict everything else and still not fit
+            return
+        if key in self._entries:
+            self.current_bytes -= self._entries.pop(key)[1]
+        self._entries[key] = (value, nbytes)
+        self.current_bytes += nbytes
+        self._evict()
+
+    # Add nbytes to the size of an entry, e.g. when arrays it shares are no longer counted elsewhere:
+    def charge(self, key, nbytes):
+        if key not in self._entries:
+            return
+        value, entry_nbytes = self._entries[key]
+        self._entries[key] = (value, entry_nbytes + nbytes)
+        self.current_bytes += nbytes
+        self._evict()
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes:
+            evicted_key, (evicted_value, evicted_nbytes) = self._entries.popitem(last=False)
+            self.current_bytes -= evicted_nbytes
+            if self.on_evict is not None:
+                self.on_evict(evicted_key, evicted_value)
+
+    def clear(self):
+        self._entries.clear()
+        self.current_bytes = 0
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
+
+def _read_only(arrays):
+    for array in arrays.values():
+        array.setflags(write=False)
+    return arrays
+
+
+# Bytes of the arrays, without the ones named in shared (already counted by another layer):
+def _nbytes(arrays, shared=()):
+    return sum(array.nbytes for name, array in arrays.items() if name not in shared)
+
+
+
+# Geometry cache with a width layer, a full geometry layer and an optional disk layer:
+# A computed geometry holds the w_max/w_min arrays of its widths entry. They are counted by the widths layer while that
+# entry is cached; once it is evicted they are charged to one of the geometries still holding them, and passed on to
+# the next one when that geometry is evicted, so the arrays kept alive are always counted exactly once
+class GeometryCache:
+    def __init__(self, max_bytes=default_max_bytes, cache_dir=None):
+        self.widths_cache = LRUCache(max_bytes // 2, on_evict=self._widths_evicted)
+        self.geometry_cache = LRUCache(max_bytes - max_bytes // 2, on_evict=self._geometry_evicted)
+        self.cache_dir = cache_dir
+        self.disk_hits = 0
+        self.disk_misses = 0
+        # Arrays shared by the two layers: {"nbytes", "holders": geometry keys, "payer": geometry key counting them or
+        # None while the widths entry does}, by widths key (while cached) and by geometry key
+        self._widths_groups = {}
+        self._geometry_groups = {}
+
+    # Keys are normalized so that e.g. i_0 = 8 and i_0 = 8.0 hit the same entry
+    @staticmethod
+    def widths_key(N_unit_cells, beam_width_narrowest, alpha_width, i_0):
+        return ("widths", int(N_unit_cells), float(beam_width_narrowest), float(alpha_width), float(i_0))
+
+    @staticmethod
+    def geometry_key(N_unit_cells, beam_length, beam_width_narrowest, alpha_width, i_0, L_d):
+        return ("geometry", int(N_unit_cells), float(beam_length), float(beam_width_narrowest), float(alpha_width), float(i_0), float(L_d))
+
+    # Width profile, (w_max, w_min):
+    def widths(self, N_unit_cells, beam_width_narrowest, alpha_width, i_0):
+        key = self.widths_key(N_unit_cells, beam_width_narrowest, alpha_width, i_0)
+        arrays = self._lookup(self.widths_cache, key)
+        if arrays is None:
+            w_max, w_min = unitcell_widths(N_unit_cells, beam_width_narrowest, alpha_width, i_0)
+            arrays = self._store(self.widths_cache, key, {"w_max": w_max, "w_min": w_min})
+        return arrays["w_max"], arrays["w_min"]
+
+    # Full geometry, same dict as generate_nanobeam_geometry():
+    def geometry(self, N_unit_cells, beam_length, beam_width_narrowest, alpha_width, i_0, L_d):
+        key = self.geometry_key(N_unit_cells, beam_length, beam_width_narrowest, alpha_width, i_0, L_d)
+        geometry = self._lookup(self.geometry_cache, key)
+        if geometry is None:
+            w_max, w_min = self.widths(N_unit_cells, beam_width_narrowest, alpha_width, i_0)
+            widths_key = self.widths_key(N_unit_cells, beam_width_narrowest, alpha_width, i_0)
+            shared = ("w_max", "w_min") if widths_key in self.widths_cache else ()     # Counted by the widths layer
+            lengths = unitcell_lengths(w_max, beam_length, L_d)
+            unit_cell_positions, half_unit_cell_position_max, half_unit_cell_position_min = unitcell_positions(lengths, L_d)
+            geometry = self._store(self.geometry_cache, key, {
+                "w_max": w_max,
+                "w_min": w_min,
+                "lengths": lengths,
+                "unit_cell_positions": unit_cell_positions,
+                "half_unit_cell_position_max": half_unit_cell_position_max,
+                "half_unit_cell_position_min": half_unit_cell_position_min,
+            }, shared=shared)
+            if shared and key in self.geometry_cache:
+                group = self._widths_groups.setdefault(widths_key, {"nbytes": w_max.nbytes + w_min.nbytes, "holders": set(), "payer": None})
+                group["holders"].add(key)
+                self._geometry_groups[key] = group
+        return geometry
+
+    def stats(self):
+        return {
+            "width_hits": self.widths_cache.hits,
+            "width_misses": self.widths_cache.misses,
+            "geometry_hits": self.geometry_cache.hits,
+            "geometry_misses": self.geometry_cache.misses,
+            "disk_hits": self.disk_hits,
+            "disk_misses": self.disk_misses,
+            "memory_bytes": self.widths_cache.current_bytes + self.geometry_cache.current_bytes,
+        }
+
+    def clear(self):    # Only clears memory, the disk cache is left alone
+        self.widths_cache.clear()
+        self.geometry_cache.clear()
+        self._widths_groups.clear()
+        self._geometry_groups.clear()
+
+    def _widths_evicted(self, key, arrays):
+        group = self._widths_groups.pop(key, None)
+        if group is not None:
+            self._pass_charge(group)
+
+    def _geometry_evicted(self, key, geometry):
+        group = self._geometry_groups.pop(key, None)
+        if group is not None:
+            group["holders"].discard(key)
+            if group["payer"] == key:
+                self._pass_charge(group)
+
+    # Charge shared arrays to a remaining holder (which may in turn be evicted and pass them on):
+    def _pass_charge(self, group):
+        group["payer"] = next(iter(group["holders"]), None)
+        if group["payer"] is not None:
+            self.geometry_cache.charge(group["payer"], group["nbytes"])
+
+    # Memory first, then disk:
+    def _lookup(self, memory_cache, key):
+        arrays = memory_cache.get(key)
+        if arrays is not None or self.cache_dir is None:
+            return arrays
+
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            self.disk_misses += 1
+            return None
+        with np.load(path) as stored:
+            arrays = _read_only({name: stored[name] for name in stored.files})
+        self.disk_hits += 1
+        memory_cache.put(key, arrays, _nbytes(arrays))
+        return arrays
+
+    def _store(self, memory_cache, key, arrays, shared=()):
+        arrays = _read_only(arrays)
+        memory_cache.put(key, arrays, _nbytes(arrays, shared))
+        if self.cache_dir is not None:
+            self._write_disk(key, arrays)
+        return arrays
+
+    def _disk_path(self, key):
+        digest = hashlib.sha256(repr(key).encode("ascii")).hexdigest()
+        return os.path.join(self.cache_dir, key[0], digest + ".npz")
+
+    def _write_disk(self, key, arrays):
+        path = self._disk_path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix=".tmp")     # Write then rename, so concurrent workers never read a partial file
+        try:
+            with os.fdopen(file_descriptor, "wb") as file:
+                np.savez(file, **arrays)
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+
+
+
+default_geometry_cache = GeometryCache()
+
+
+# Drop-in cached version of generate_nanobeam_geometry():
+def cached_generate_nanobeam_geometry(N_unit_cells, beam_length, beam_width_narrowest, alpha_width, i_0, L_d):
+    return default_geometry_cache.geometry(N_unit_cells, beam_length, beam_width_narrowest, alpha_width, i_0, L_d)
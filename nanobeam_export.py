@@ -0,0 +1,179 @@
+# Nanobeam Geometry Export
+
+# Streaming writers for the geometry arrays generated by nanobeam_geometry.py
+#   - write_comsol_parameters(): COMSOL "Parameters -> Load from file" format, one [name] [value[unit]] [description] row per parameter
+#   - write_csv() / write_tab_delimited(): one row per unit cell, one column per geometry array
+#   - save_geometry_binary() / save_sweep_binary(): a .npy array with one row per geometry array plus a small .json header
+#     holding the parameters, loaded back zero-copy with np.memmap by load_geometry_binary() / load_sweep_binary()
+# Rows are formatted a block at a time and each block is written with a single write() call,
+# so exporting is linear in the number of cells and only one block of text is held in memory at a time
+# Values are written with repr(), which round-trips floats exactly
+#
+# Usage:
+#   geometry = generate_nanobeam_geometry(...)
+#   write_comsol_parameters("nanobeam_50_comsol.txt", geometry)
+#   write_csv("nanobeam_50.csv", geometry)
+#   save_geometry_binary("nanobeam_50", geometry, parameters={"N_unit_cells": 50, ...})
+#   geometry, header = load_geometry_binary("nanobeam_50")     # memory mapped, only the slices you touch are read
+
+
+import json
+
+import numpy as np
+
+from instrumentation import instrument
+from nanobeam_sweep import sweep_parameter_names
+
+
+block_rows = 8192   # Number of rows formatted per write() call
+
+# (geometry field, COMSOL parameter name prefix, description, column header)
+exported_fields = (
+    ("w_max", "w_max", "Unit cell maximum width w_max(i)", "w_max [m]"),
+    ("w_min", "w_min", "Unit cell minimum width w_min(i)", "w_min [m]"),
+    ("lengths", "L_c", "Unit cell length L_c(i)", "L_c [m]"),
+    ("unit_cell_positions", "x_c", "Unit cell center position", "x_c [m]"),
+    ("half_unit_cell_position_max", "x_max", "Half unit cell position (max width)", "x_max [m]"),
+    ("half_unit_cell_position_min", "x_min", "Half unit cell position (min width)", "x_min [m]"),
+)
+
+
+
+# Write an iterable of already formatted lines in blocks:
+def _write_blocks(file, line_blocks):
+    for lines in line_blocks:
+        file.write("".join(lines))
+
+
+
+# COMSOL parameter rows for one array, block by block:
+def _comsol_rows(values, name_prefix, description, unit):
+    for start in range(0, len(values), block_rows):
+        block = np.asarray(values[start:start + block_rows]).tolist()    # Python floats, so repr() gives the shortest round-trip string
+        yield ["%s_%d %r[%s] \"%s %d\"\n" % (name_prefix, start + k, value, unit, description, start + k) for k, value in enumerate(block)]
+
+
+
+# Write the geometry as a COMSOL-loadable parameter file:
+@instrument("nanobeam.export.comsol")
+def write_comsol_parameters(file_name, geometry, unit="m", extra_parameters=None):
+    # extra_parameters: optional list of (name, value, unit, description) tuples written first, e.g. L_d or beam_length
+    with open(file_name, "w", buffering=1 << 20) as file:
+        if extra_parameters is not None:
+            file.write("".join("%s %r[%s] \"%s\"\n" % (name, value, value_unit, description)
+                               for name, value, value_unit, description in extra_parameters))
+
+        for field, name_prefix, description, _ in exported_fields:
+            _write_blocks(file, _comsol_rows(geometry[field], name_prefix, description, unit))
+
+
+
+# Table rows, one unit cell per row:
+def _table_rows(geometry, delimiter):
+    columns = [geometry[field] for field, _, _, _ in exported_fields]
+    n_cells = len(columns[0])
+    row_format = delimiter.join(["%d"] + ["%r"] * len(columns)) + "\n"
+
+    for start in range(0, n_cells, block_rows):
+        block_columns = [np.asarray(column[start:start + block_rows]).tolist() for column in columns]
+        yield [row_format % ((start + k,) + row) for k, row in enumerate(zip(*block_columns))]
+
+
+def _write_table(file_name, geometry, delimiter):
+    header = delimiter.join(["i"] + [column_header for _, _, _, column_header in exported_fields]) + "\n"
+    with open(file_name, "w", buffering=1 << 20, newline="") as file:
+        file.write(header)
+        _write_blocks(file, _table_rows(geometry, delimiter))
+
+
+
+# Write the geometry as a CSV file:
+@instrument("nanobeam.export.csv")
+def write_csv(file_name, geometry):
+    _write_table(file_name, geometry, ",")
+
+
+
+# Write the geometry as a tab-delimited file:
+@instrument("nanobeam.export.tsv")
+def write_tab_delimited(file_name, geometry):
+    _write_table(file_name, geometry, "\t")
+
+
+
+# Binary geometry format:
+#   <base>.npy   float64 array of shape (len(binary_fields), n_cells), each geometry array is one contiguous row
+#   <base>.json  {"format": ..., "fields": [...], "n_cells": n, "parameters": {...}}
+# Sweeps (nanobeam_sweep.py) store all of their points in the same (fields, cells) array, plus
+#   <base>_offsets.npy     cells of point k are the columns [offsets[k], offsets[k+1])
+#   <base>_parameters.npy  (n_points, 6) parameter tuples, columns named in the header
+binary_format = "nanobeam-geometry-v1"
+binary_fields = tuple(field for field, _, _, _ in exported_fields)
+
+
+def _write_header(base_name, header):
+    with open(base_name + ".json", "w") as file:
+        json.dump(header, file, indent=2)
+
+
+def _read_header(base_name):
+    with open(base_name + ".json") as file:
+        header = json.load(file)
+    if header.get("format") != binary_format:
+        raise ValueError("Not a nanobeam geometry file: " + base_name + ".json")
+    return header
+
+
+# Write the fields into a memory mapped .npy one row at a time, so no stacked copy of the data is made:
+def _write_field_rows(file_name, geometry):
+    n_cells = len(geometry[binary_fields[0]])
+    rows = np.lib.format.open_memmap(file_name, mode="w+", dtype=np.float64, shape=(len(binary_fields), n_cells))
+    for row, field in enumerate(binary_fields):
+        rows[row] = geometry[field]
+    rows.flush()
+    del rows
+    return n_cells
+
+
+def _field_views(rows):
+    return {field: rows[row] for row, field in enumerate(binary_fields)}
+
+
+
+# Save one geometry:
+@instrument("nanobeam.export.binary")
+def save_geometry_binary(base_name, geometry, parameters=None):
+    n_cells = _write_field_rows(base_name + ".npy", geometry)
+    _write_header(base_name, {"format": binary_format, "fields": list(binary_fields), "n_cells": n_cells,
+                              "parameters": {} if parameters is None else dict(parameters)})
+
+
+
+# Load one geometry, returns ({field: array}, header); with mmap=True the arrays are read-only views into the file:
+def load_geometry_binary(base_name, mmap=True):
+    header = _read_header(base_name)
+    rows = np.load(base_name + ".npy", mmap_mode="r" if mmap else None)
+    return _field_views(rows), header
+
+
+
+# Save a sweep store from nanobeam_sweep.run_sweep():
+def save_sweep_binary(base_name, store, parameter_names=sweep_parameter_names):
+    n_cells = _write_field_rows(base_name + ".npy", store)
+    np.save(base_name + "_offsets.npy", store["offsets"])
+    np.save(base_name + "_parameters.npy", store["parameters"])
+    _write_header(base_name, {"format": binary_format, "fields": list(binary_fields), "n_cells": n_cells,
+                              "n_points": len(store["parameters"]), "parameter_names": list(parameter_names)})
+
+
+
+# Load a sweep store, usable with nanobeam_sweep.sweep_geometry(); the index is keyed by float parameter tuples:
+def load_sweep_binary(base_name, mmap=True):
+    header = _read_header(base_name)
+    mmap_mode = "r" if mmap else None
+    store = _field_views(np.load(base_name + ".npy", mmap_mode=mmap_mode))
+    store["offsets"] = np.load(base_name + "_offsets.npy", mmap_mode=mmap_mode)
+    store["parameters"] = np.load(base_name + "_parameters.npy")
+    store["index"] = {tuple(row): k for k, row in enumerate(store["parameters"].tolist())}
+    store["header"] = header
+    return store
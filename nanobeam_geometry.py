@@ -0,0 +1,92 @@
+# Nanobeam Geometry Engine
+
+# Vectorized NumPy version of the geometry generation in nanobeam_parameters.py
+# All of the widths, lengths and positions are computed as contiguous arrays instead of nested Python lists:
+#   - the Gaussian taper ratio product telescopes, so every w_max(i) comes from one closed-form ratio
+#   - the positions come from a single cumulative sum of the lengths, so generation is O(N) instead of O(N^2)
+# The outputs match nanobeam_unitcell_widths(), nanobeam_unitcell_lengths(), generate_positions_of_unit_cells()
+# and generate_positions_of_half_unit_cells() to floating point tolerance
+#
+# Usage:
+#   geometry = generate_nanobeam_geometry(N_unit_cells=50, beam_length=4e-3, beam_width_narrowest=400e-9,
+#                                         alpha_width=0.15, i_0=8, L_d=50e-6)
+#   geometry["w_max"], geometry["lengths"], geometry["unit_cell_positions"], ...
+
+
+import numpy as np
+
+from instrumentation import stage
+
+
+max_to_min_width_ratio = 2.3    # w_max(0) = 2.3 * w_min(0), and w_min(i) = w_max(i-1)/2.3
+
+
+
+# Gaussian envelope used to taper the beam width, 1 - (1-alpha)*exp(-i^2/i_0^2):
+def gaussian_taper(N_unit_cells, alpha_width, i_0):
+    i = np.arange(int(N_unit_cells/2), dtype=np.float64)    # Unit cell index, only half of the beam since it is symmetric across the central defect
+    return 1 - (1 - alpha_width) * np.exp(-(i**2) / (i_0**2))
+
+
+
+# Generating widths:
+def unitcell_widths(N_unit_cells, beam_width_narrowest, alpha_width, i_0):
+    taper = gaussian_taper(N_unit_cells, alpha_width, i_0)
+    w_max = np.empty_like(taper)
+    w_min = np.empty_like(taper)
+
+    if (taper.size == 0):
+        return w_max, w_min
+
+    # The product of the ratios taper(k)/taper(k-1) for k = 1..i telescopes to taper(i)/taper(0)
+    w_max[:] = (beam_width_narrowest * max_to_min_width_ratio) * (taper / taper[0])
+    w_min[0] = beam_width_narrowest
+    w_min[1:] = w_max[:-1] / max_to_min_width_ratio
+
+    return w_max, w_min     # Half of the beam widths, because it is symmetric across the central defect
+
+
+
+# Generating lengths:
+def unitcell_lengths(w_max, beam_length, L_d):
+    inverse_sqrt_width = 1 / np.sqrt(w_max)     # Lc(i) ~ 1/sqrt(w_max(i))
+    allowed_half_length_total = (beam_length - L_d) / 2     # Allowed length for one half of the unit cells on the nanobeam
+    m = allowed_half_length_total / inverse_sqrt_width.sum()     # Multiplicative factor such that the lengths sum to allowed_half_length_total
+
+    return inverse_sqrt_width * m
+
+
+
+# Generating positions of unit cells and half unit cells (origin at the center of the central defect):
+def unitcell_positions(lengths, L_d):
+    preceding_length = np.empty_like(lengths)   # Sum of the lengths of all of the unit cells before cell i (exclusive prefix sum)
+    if (lengths.size > 0):
+        preceding_length[0] = 0
+        np.cumsum(lengths[:-1], out=preceding_length[1:])
+    cell_start = preceding_length + (L_d / 2)
+
+    unit_cell_positions = cell_start + lengths / 2
+    half_unit_cell_position_max = cell_start + lengths * 0.75    # L/2 + L/4, max width half of the cell
+    half_unit_cell_position_min = cell_start + lengths * 0.25    # L/2 - L/4, min width half of the cell
+
+    return unit_cell_positions, half_unit_cell_position_max, half_unit_cell_position_min
+
+
+
+# Generate the full geometry:
+def generate_nanobeam_geometry(N_unit_cells, beam_length, beam_width_narrowest, alpha_width, i_0, L_d):
+    with stage("nanobeam.widths", N_unit_cells=N_unit_cells):
+        w_max, w_min = unitcell_widths(N_unit_cells, beam_width_narrowest, alpha_width, i_0)
+    with stage("nanobeam.lengths", w_max=w_max):
+        lengths = unitcell_lengths(w_max, beam_length, L_d)
+    with stage("nanobeam.positions", lengths=lengths):
+        unit_cell_positions, half_unit_cell_position_max, half_unit_cell_position_min = unitcell_positions(lengths, L_d)
+
+    return {
+        "w_max": w_max,
+        "w_min": w_min,
+        "lengths": lengths,
+        "unit_cell_positions": unit_cell_positions,
+        "half_unit_cell_position_max": half_unit_cell_position_max,
+        "half_unit_cell_position_min": half_unit_cell_position_min,
+    }
@@ -3,24 +3,24 @@
 
 # This program generates a set of nanobeam geometry parameters to be used in numerical simulations (e.g. COMSOL Multiphysics)
 # There are a set of tunable parameters one may change such that the resulting nanobeam geometry changes accordingly
-# The parameters are then returned in a .txt file for easy viewing and accessing
+# The parameters are then returned in a .txt file for easy viewing and accessing, and exported (nanobeam_export.py) as
+# a COMSOL parameter file, a CSV file and a tab-delimited file
 # To run the program, simple type the desired parameters below and compile as usual
-# Can be used in conjunction with an Excel spreadsheet to visualize and organize the data in a way the numerical simulation program understands
 
-# Instructions for running program and using the generated data in Excel & COMSOL Multiphysics:
+# Instructions for running program and using the generated data in COMSOL Multiphysics:
 # 1) Choose appropriate parameters below
 # 2) Run program (compile)
-# 3) Copy-paste data lists from generated text file to an Excel spreadsheet
-# 4) Use "Text to Columns" option under "Data" tab in Excel to convert data into columns
-# 5) In the pop-up wizard, choose "Delimited", with the delimiters being "Tab", "Comma". Choose the format as "General".
-# 6) Copy the generated columns; choose a location to paste, and do: "paste special" -> "transpose"
-# 7) In COMSOL, under the "Parameters" section, choose "Load from file" and select the Excel spreadsheet
-# 8) Choose the appropriate columns/rows. Note that the format COMSOL prefers in adjacent columns is: [name][value[units]][description]
-# 9) Note that the column next to the data chosen from the spreadsheet is the description of the parameter (data chosen) if left unselected
+# 3) In COMSOL, under the "Parameters" section, choose "Load from file" and select the generated *_comsol.txt file
+# 4) Each row is already in the format COMSOL expects: [name] [value[units]] [description], e.g. w_max_0 9.2e-07[m] "Unit cell maximum width w_max(i) 0"
+# 5) The .csv/.tsv files hold the same data with one unit cell per row, for spreadsheets or other programs
 
 
 import math
 import datetime
+import numpy as np
+from instrumentation import instrument, stage
+from nanobeam_geometry import generate_nanobeam_geometry
+from nanobeam_export import write_comsol_parameters, write_csv, write_tab_delimited, save_geometry_binary
 
 
 # Tunable parameters:
@@ -34,6 +34,10 @@ i_0 = 8  #Parameter used in the calculation of the beam width, ranges from 8 to
 L_d = 50 * 10**(-6)  #Scale of 10^1 [um], Central defect length, this typically ranges from the 10s to 100 um
 length_units = ' [m] '   #Unit of meters, this is used in a function to generate numbers easily recognizable by COMSOL
 file_name = "nanobeam_geometry_parameters" + "_" + str(N_unit_cells) + "_unit_cells.txt"    #File name generated based on unit cell numbers
+comsol_file_name = "nanobeam_geometry_parameters" + "_" + str(N_unit_cells) + "_unit_cells_comsol.txt"    #COMSOL "Load from file" parameter file
+csv_file_name = "nanobeam_geometry_parameters" + "_" + str(N_unit_cells) + "_unit_cells.csv"
+tsv_file_name = "nanobeam_geometry_parameters" + "_" + str(N_unit_cells) + "_unit_cells.tsv"
+binary_base_name = "nanobeam_geometry_parameters" + "_" + str(N_unit_cells) + "_unit_cells"    #.npy + .json header, for downstream analysis
 
 
 
@@ -105,23 +109,27 @@ def return_two_lists(L):    #takes in a list of lists in the form [ [,], [,], [,
 
 
 # Add units to values in a list:
-def add_units_to_parameter_list(parameter_list, unit):     #Function for adding units (e.g.: [m]) to each index of a list. Unit must be a string, pre-declared
-    index_list = [None] * (len(parameter_list))     #One less comma than the number of elements in a list
-    index = 0   #Initialize index
-    updating_index = 0  #Initialize index to be updated in loop
-    str_parameter_list = str(parameter_list)    #Easier to work with it in string form
-
-    for i in range(0, len(index_list)):
-        if(i==0):
-            index = str_parameter_list.find(",")    #Look for index of comma that separates the numbers
-            index_list[i] = index   #Add to index list
-            str_parameter_list = str_parameter_list[:index] + unit + str_parameter_list[index:]     #Slicing notation, adds unit after the number
+# Every number is followed by the unit, the last one included: "[1e-06 [m] , 2e-06 [m] ]"; nested lists likewise,
+# "[[9.2e-07 [m] , 4e-07 [m] ], ...]". For flat lists this is the text of the earlier string-slicing version. For
+# nested lists (the width list) that version put the unit after the inner "]" of the first pairs and none on the rest,
+# "[[9.2e-07 [m] , 4e-07] [m] , ..., [6.1e-06, 2.7e-06]]", so the width list of the report changed
+@instrument("nanobeam.add_units")
+def add_units_to_parameter_list(parameter_list, unit):     #Function for adding units (e.g.: [m]) to each number of a (possibly nested) list. Unit must be a string, pre-declared
+    parts = []  #Pieces of the output string, joined once at the end so the cost is linear in the list length
+
+    def add_parts(element):
+        if isinstance(element, (list, tuple)):
+            parts.append("[")
+            for i in range(0, len(element)):
+                if (i != 0):
+                    parts.append(", ")
+                add_parts(element[i])
+            parts.append("]")
         else:
-            updating_index = str_parameter_list.find(",", index_list[i-1] + 6 )   #Shifts index in string such that next comma can be considered without repetition
-            index_list[i] = updating_index  #Update index list
-            str_parameter_list = str_parameter_list[:updating_index] + unit + str_parameter_list[updating_index:]     #Slicing notation, adds unit after the number
+            parts.append(repr(float(element)) + unit)     #Adds unit after the number
 
-    return str_parameter_list
+    add_parts(list(parameter_list))
+    return "".join(parts)
 
 
 
@@ -182,92 +190,95 @@ def generate_positions_of_unit_cells(N_unit_cells, L_d, length_list):  # Works f
 
 # Generate data:
 
-length_parameters = nanobeam_unitcell_lengths(N_unit_cells, beam_length)
-print("Length Parameters:\n")
-print(length_parameters)
-
-
-width_parameters = nanobeam_unitcell_widths(N_unit_cells, beam_width_narrowest)
-print("\n Width Parameters:\n")
-print(width_parameters)
-
-
-length_sum = sum_list(length_parameters)
-print("\n Length sum:", length_sum)       # We expect this to be around 2mm, or half of the total beam width
-print("0.5*(Beam length - L_d) - Length sum:", 0.5* (beam_length - L_d) - length_sum)   # If the lengths are correctly computed, then this should be zero, or very small due to floating point error
-
-
-w_max, w_min = return_two_lists(width_parameters)   #Seperates the max and min width parameters into two lists
-
-
-unit_cell_positions = generate_positions_of_unit_cells(N_unit_cells, L_d, length_parameters)
-half_unit_cell_position_max, half_unit_cell_position_min = generate_positions_of_half_unit_cells(N_unit_cells, L_d, length_parameters)
-
-print("\n Unit cell positions: \n")
-print(unit_cell_positions)
-print("\n Half unit cell positions max: \n")
-print(half_unit_cell_position_max)
-print("\n Half unit cell positions min: \n")
-print(half_unit_cell_position_min)
-
-
-# Write data generated to a .txt file:
-file1 = open(file_name, "w")
-
-# String format of lists that hold the generated data to be printed to the text file. Function adds units and converts to string format to be printed.
-L_width_parameters = add_units_to_parameter_list(width_parameters, length_units)  #str(width_parameters)
-L_length_parameters = add_units_to_parameter_list(length_parameters, length_units)  #str(length_parameters)
-L_w_max = add_units_to_parameter_list(w_max,length_units)  #str(w_max)
-L_w_min = add_units_to_parameter_list(w_min, length_units)  #str(w_min)
-L_unit_cell_positions = add_units_to_parameter_list(unit_cell_positions, length_units)  #str(unit_cell_positions)
-L_half_unit_cell_position_max = add_units_to_parameter_list(half_unit_cell_position_max, length_units)  #str(half_unit_cell_position_max)
-L_half_unit_cell_position_min = add_units_to_parameter_list(half_unit_cell_position_min, length_units)  #str(half_unit_cell_position_min)
-
-date = datetime.date.today()
-print(date)
-
-
-# \n is placed to indicate EOL (End of Line)
-file1.writelines("The generated parameters for the nanobeam include: unit cell widths, unit cell lengths, unit cell positions, and relevant program parameters used. \n \n")
-file1.writelines("\n \n Date Modified: ")
-file1.writelines(str(date))
-file1.writelines('\n \n \n \n Width list [[w_max(i,j), w_min(i,j)]]: \n \n')
-file1.writelines(L_width_parameters)
-file1.writelines('\n \n \n Length list [L_c(i)]: \n \n')
-file1.writelines(L_length_parameters)
-file1.writelines("\n \n \n Length sum (should be very close to beam length): ")
-file1.writelines(str(length_sum)+ '[m]')
-file1.writelines("\n \n 0.5*(Beam length - L_d) - Length sum (should be <<1):")
-file1.writelines(str(0.5* (beam_length - L_d) - length_sum)+ '[m]')
-file1.writelines("\n \n \n \n Unit cell width maximums (w_max(i)): \n \n")
-file1.writelines(L_w_max)
-file1.writelines("\n \n \n Unit cell width minimums (w_min(i)): \n \n")
-file1.writelines(L_w_min)
-file1.writelines("\n \n \n Unit cell positions: \n \n")
-file1.writelines(L_unit_cell_positions)
-file1.writelines("\n \n \n Unit cell half cell positions (max widths): \n \n")
-file1.writelines(L_half_unit_cell_position_max)
-file1.writelines("\n \n \n Unit cell half cell positions (min widths): \n \n")
-file1.writelines(L_half_unit_cell_position_min)
-file1.writelines("\n \n \n \n \n Parameters used: ")
-file1.writelines("\n \n Central defect length: ")
-file1.writelines(str(L_d)+ '[m]')
-file1.writelines("\n \n Beam length: ")
-file1.writelines(str(beam_length) + '[m]')
-file1.writelines("\n \n Minimum beam width: ")
-file1.writelines(str(beam_width_narrowest)+ '[m]')
-file1.writelines("\n \n Beam thickness: ")
-file1.writelines(str(beam_thickness)+ '[m]')
-file1.writelines("\n \n Number of unit cells: ")
-file1.writelines(str(N_unit_cells))
-file1.writelines("\n \n Parameters used for tapering the width of the beam: ")
-file1.writelines("\n \n alpha_width: ")
-file1.writelines(str(alpha_width))
-file1.writelines("\n \n i_0: ")
-file1.writelines(str(i_0))
-
-
-file1.close()  # to change file access modes
+if __name__ == "__main__":
+    # The list-based functions above are kept as the reference implementation; the vectorized engine (nanobeam_geometry.py) generates the data
+    with stage("nanobeam.generate", N_unit_cells=N_unit_cells):
+        geometry = generate_nanobeam_geometry(N_unit_cells, beam_length, beam_width_narrowest, alpha_width, i_0, L_d)
+
+    length_parameters = geometry["lengths"].tolist()
+    print("Length Parameters:\n")
+    print(length_parameters)
+
+
+    width_parameters = np.column_stack((geometry["w_max"], geometry["w_min"])).tolist()     # [[w_max(i), w_min(i)], ...], same layout as nanobeam_unitcell_widths()
+    print("\n Width Parameters:\n")
+    print(width_parameters)
+
+
+    length_sum = sum_list(length_parameters)
+    print("\n Length sum:", length_sum)       # We expect this to be around 2mm, or half of the total beam width
+    print("0.5*(Beam length - L_d) - Length sum:", 0.5* (beam_length - L_d) - length_sum)   # If the lengths are correctly computed, then this should be zero, or very small due to floating point error
+
+
+    w_max, w_min = return_two_lists(width_parameters)   #Seperates the max and min width parameters into two lists
+
+
+    unit_cell_positions = geometry["unit_cell_positions"].tolist()
+    half_unit_cell_position_max = geometry["half_unit_cell_position_max"].tolist()
+    half_unit_cell_position_min = geometry["half_unit_cell_position_min"].tolist()
+
+    print("\n Unit cell positions: \n")
+    print(unit_cell_positions)
+    print("\n Half unit cell positions max: \n")
+    print(half_unit_cell_position_max)
+    print("\n Half unit cell positions min: \n")
+    print(half_unit_cell_position_min)
+
+
+    # String format of lists that hold the generated data to be printed to the text file. Function adds units and converts to string format to be printed.
+    L_width_parameters = add_units_to_parameter_list(width_parameters, length_units)  #str(width_parameters)
+    L_length_parameters = add_units_to_parameter_list(length_parameters, length_units)  #str(length_parameters)
+    L_w_max = add_units_to_parameter_list(w_max,length_units)  #str(w_max)
+    L_w_min = add_units_to_parameter_list(w_min, length_units)  #str(w_min)
+    L_unit_cell_positions = add_units_to_parameter_list(unit_cell_positions, length_units)  #str(unit_cell_positions)
+    L_half_unit_cell_position_max = add_units_to_parameter_list(half_unit_cell_position_max, length_units)  #str(half_unit_cell_position_max)
+    L_half_unit_cell_position_min = add_units_to_parameter_list(half_unit_cell_position_min, length_units)  #str(half_unit_cell_position_min)
+
+    date = datetime.date.today()
+    print(date)
+
+
+    # Write data generated to a .txt file, in one bulk write:
+    # \n is placed to indicate EOL (End of Line)
+    report = [
+        "The generated parameters for the nanobeam include: unit cell widths, unit cell lengths, unit cell positions, and relevant program parameters used. \n \n",
+        "\n \n Date Modified: ", str(date),
+        '\n \n \n \n Width list [[w_max(i,j), w_min(i,j)]]: \n \n', L_width_parameters,
+        '\n \n \n Length list [L_c(i)]: \n \n', L_length_parameters,
+        "\n \n \n Length sum (should be very close to beam length): ", str(length_sum) + '[m]',
+        "\n \n 0.5*(Beam length - L_d) - Length sum (should be <<1):", str(0.5* (beam_length - L_d) - length_sum) + '[m]',
+        "\n \n \n \n Unit cell width maximums (w_max(i)): \n \n", L_w_max,
+        "\n \n \n Unit cell width minimums (w_min(i)): \n \n", L_w_min,
+        "\n \n \n Unit cell positions: \n \n", L_unit_cell_positions,
+        "\n \n \n Unit cell half cell positions (max widths): \n \n", L_half_unit_cell_position_max,
+        "\n \n \n Unit cell half cell positions (min widths): \n \n", L_half_unit_cell_position_min,
+        "\n \n \n \n \n Parameters used: ",
+        "\n \n Central defect length: ", str(L_d) + '[m]',
+        "\n \n Beam length: ", str(beam_length) + '[m]',
+        "\n \n Minimum beam width: ", str(beam_width_narrowest) + '[m]',
+        "\n \n Beam thickness: ", str(beam_thickness) + '[m]',
+        "\n \n Number of unit cells: ", str(N_unit_cells),
+        "\n \n Parameters used for tapering the width of the beam: ",
+        "\n \n alpha_width: ", str(alpha_width),
+        "\n \n i_0: ", str(i_0),
+    ]
+    with stage("nanobeam.write_report", file_name=file_name), open(file_name, "w") as file1:
+        file1.write("".join(report))
+
+
+    # Streaming exports, ready to be loaded without any spreadsheet post-processing:
+    program_parameters = [
+        ("L_d", L_d, "m", "Central defect length"),
+        ("beam_length", beam_length, "m", "Beam length"),
+        ("beam_width_narrowest", beam_width_narrowest, "m", "Minimum beam width"),
+        ("beam_thickness", beam_thickness, "m", "Beam thickness"),
+    ]
+    write_comsol_parameters(comsol_file_name, geometry, extra_parameters=program_parameters)
+    write_csv(csv_file_name, geometry)
+    write_tab_delimited(tsv_file_name, geometry)
+    save_geometry_binary(binary_base_name, geometry, parameters={
+        "N_unit_cells": N_unit_cells, "beam_length": beam_length, "beam_width_narrowest": beam_width_narrowest,
+        "beam_thickness": beam_thickness, "alpha_width": alpha_width, "i_0": i_0, "L_d": L_d})
 
 
 
@@ -0,0 +1,147 @@
+# Nanobeam Parameter Sweep Runner
+
+# Builds the nanobeam geometry (nanobeam_geometry.py) for every point of a parameter grid in one interpreter,
+# fanning the builds out over a process pool in chunks of grid points (one task per chunk instead of one per point)
+# The results are collected into a single columnar store:
+#   - store["parameters"]  (n_points, 6) array, one row per parameter tuple, columns ordered as sweep_parameter_names
+#   - store["offsets"]     (n_points + 1,) array, the half-beam cells of point k live in [offsets[k], offsets[k+1])
+#   - store[field]         one flat array per geometry field (w_max, w_min, lengths, positions), all points concatenated
+#   - store["index"]       dict mapping the parameter tuple -> row k
+# Each worker process keeps a GeometryCache (nanobeam_cache.py), so grid points that share a width profile reuse it,
+# and passing cache_dir reuses geometries built by earlier sweeps
+#
+# Usage:
+#   grid = parameter_grid(N_unit_cells=[40, 50, 60], alpha_width=[0.15, 0.2], i_0=[8, 9, 10], L_d=[50e-6, 100e-6])
+#   store = run_sweep(grid)
+#   geometry = sweep_geometry(store, grid[0])
+
+
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from nanobeam_cache import GeometryCache
+
+
+sweep_parameter_names = ("N_unit_cells", "beam_length", "beam_width_narrowest", "alpha_width", "i_0", "L_d")   # Same order as generate_nanobeam_geometry()
+geometry_fields = ("w_max", "w_min", "lengths", "unit_cell_positions", "half_unit_cell_position_max", "half_unit_cell_position_min")
+
+# Default values, the same as the tunable parameters in nanobeam_parameters.py
+default_parameters = {
+    "N_unit_cells": 50,
+    "beam_length": 4 * 10**(-3),
+    "beam_width_narrowest": 400 * 10**(-9),
+    "alpha_width": 0.15,
+    "i_0": 8,
+    "L_d": 50 * 10**(-6),
+}
+
+
+
+# Cartesian product of the swept values, parameters that are not given keep their default value:
+def parameter_grid(**swept_values):
+    for name in swept_values:
+        if name not in sweep_parameter_names:
+            raise ValueError("Unknown sweep parameter: " + str(name))
+
+    axes = []
+    for name in sweep_parameter_names:
+        values = swept_values.get(name, default_parameters[name])
+        if np.ndim(values) == 0:    # A single value is a sweep axis of length 1
+            values = [values]
+        axes.append(list(values))
+
+    return list(itertools.product(*axes))
+
+
+
+# One geometry cache per process and cache directory, kept alive between the chunks a worker processes:
+_worker_caches = {}
+
+def _worker_cache(cache_dir):
+    if cache_dir not in _worker_caches:
+        _worker_caches[cache_dir] = GeometryCache(cache_dir=cache_dir)
+    return _worker_caches[cache_dir]
+
+
+
+# Worker: build every geometry of one chunk and return it already concatenated (one pickled result per chunk):
+def _build_chunk(parameter_chunk, cache_dir=None):
+    cache = _worker_cache(cache_dir)
+    fields = {name: [] for name in geometry_fields}
+    cell_counts = np.empty(len(parameter_chunk), dtype=np.int64)
+
+    for k, parameters in enumerate(parameter_chunk):
+        geometry = cache.geometry(*parameters)
+        for name in geometry_fields:
+            fields[name].append(geometry[name])
+        cell_counts[k] = geometry["lengths"].size
+
+    return cell_counts, {name: _concatenate(fields[name]) for name in geometry_fields}
+
+
+def _concatenate(arrays):
+    if len(arrays) == 0:
+        return np.empty(0, dtype=np.float64)
+    return np.concatenate(arrays)
+
+
+
+# Split the grid into contiguous chunks, about 4 chunks per worker so the pool stays balanced:
+def _split_grid(grid, processes, chunk_size):
+    if chunk_size is None:
+        chunk_size = max(1, -(-len(grid) // (4 * processes)))     # ceil division
+    return [grid[k:k + chunk_size] for k in range(0, len(grid), chunk_size)]
+
+
+
+# Run the sweep:
+def run_sweep(grid, processes=None, chunk_size=None, cache_dir=None):
+    grid = [tuple(parameters) for parameters in grid]
+    if processes is None:
+        processes = os.cpu_count() or 1
+    chunks = _split_grid(grid, processes, chunk_size)
+    build_chunk = partial(_build_chunk, cache_dir=cache_dir)
+
+    if processes == 1 or len(chunks) <= 1:     # No point paying for process start-up
+        chunk_results = [build_chunk(chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            chunk_results = list(executor.map(build_chunk, chunks))   # map keeps the chunks in grid order
+
+    cell_counts = _concatenate([counts for counts, _ in chunk_results]).astype(np.int64)
+    offsets = np.zeros(len(grid) + 1, dtype=np.int64)
+    np.cumsum(cell_counts, out=offsets[1:])
+
+    store = {
+        "parameters": np.array(grid, dtype=np.float64).reshape(len(grid), len(sweep_parameter_names)),
+        "offsets": offsets,
+        "index": {parameters: k for k, parameters in enumerate(grid)},
+    }
+    for name in geometry_fields:
+        store[name] = _concatenate([fields[name] for _, fields in chunk_results])
+
+    return store
+
+
+
+# Look up the geometry of one parameter tuple in the columnar store (views, no copies):
+def sweep_geometry(store, parameters):
+    k = store["index"][tuple(parameters)]
+    start, stop = store["offsets"][k], store["offsets"][k + 1]
+    return {name: store[name][start:stop] for name in geometry_fields}
+
+
+
+if __name__ == "__main__":
+    import time
+
+    grid = parameter_grid(N_unit_cells=range(40, 102, 2), alpha_width=np.linspace(0.15, 0.2, 6),
+                          i_0=[8, 9, 10], L_d=np.linspace(10e-6, 100e-6, 19))
+    start_time = time.perf_counter()
+    store = run_sweep(grid)
+    print("Sweep of", len(grid), "geometries:", time.perf_counter() - start_time, "s")
+    print("Total half-beam unit cells stored:", store["offsets"][-1])
@@ -0,0 +1,151 @@
+# Noise Generation
+
+# White, exponentially correlated (Ornstein-Uhlenbeck) and arbitrary-PSD noise, each using the fastest exact method:
+#   - exponential kernels exp(-t/tau) are a one-pole IIR filter, O(N) with lfilter instead of an O(N*M) convolution;
+#     a kernel truncated after M taps is still exact in O(N): y_M[n] = y[n] - a^M * y[n-M]
+#   - arbitrary kernels use direct convolution when short and FFT (overlap-add) convolution when long
+#   - arbitrary one-sided PSDs are synthesized by shaping white noise in the frequency domain
+# The filter classes carry their state (IIR state, output history or overlap tail) between calls to process(),
+# so arbitrarily long noise records can be generated chunk by chunk and are identical to a single long call
+#
+# Usage:
+#   s = exponential_kernel_noise(np.random.randn(10000), dt=0.001, tau=0.05, gain=10, taps=1000)
+#   stream = noise_chunks(OrnsteinUhlenbeckFilter(dt=0.001, tau=0.05, sigma=1.0), chunk_size=2**16)
+#   first_chunk = next(stream)
+
+
+import numpy as np
+
+
+direct_convolution_taps = 64    # Kernels up to this length are convolved directly, longer ones through the FFT
+
+
+
+def _signal():      # scipy.signal, imported on first use so that the module imports with NumPy only
+    from scipy import signal
+    return signal
+
+
+def _rng(rng):
+    return rng if isinstance(rng, np.random.Generator) else np.random.default_rng(rng)
+
+
+
+# Gaussian white noise with standard deviation sigma:
+def white_noise(n, sigma=1.0, rng=None):
+    return sigma * _rng(rng).standard_normal(n)
+
+
+
+# Causal filter with kernel gain*dt*exp(-t/tau), t = 0, dt, 2dt, ..., optionally truncated after taps samples:
+# Filters along the last axis, so a (realizations, time) array filters every realization independently
+class ExponentialFilter:
+    def __init__(self, dt, tau, gain=1.0, taps=None):
+        self.decay = np.exp(-dt / tau)
+        self.scale = gain * dt
+        self.taps = taps
+        self.state = None       # lfilter state, carries y[n-1], shape (..., 1)
+        self.history = None     # Last taps untruncated outputs, shape (..., taps)
+
+    def process(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        if self.state is None:
+            self.state = np.zeros(x.shape[:-1] + (1,))
+            if self.taps is not None:
+                self.history = np.zeros(x.shape[:-1] + (self.taps,))
+        y, self.state = _signal().lfilter([1.0], [1.0, -self.decay], x, axis=-1, zi=self.state)    # y[n] = x[n] + a*y[n-1]
+
+        if self.taps is not None:
+            # Remove the part of the exponential tail beyond taps: y[n] - a^taps * y[n - taps]
+            extended = np.concatenate((self.history, y), axis=-1)
+            truncated = y - self.decay**self.taps * extended[..., :y.shape[-1]]
+            self.history = extended[..., -self.taps:]
+            y = truncated
+        return self.scale * y
+
+
+
+# Same result as gain*dt*np.convolve(x, exp(-t/tau)[:taps])[:len(x)], in O(N):
+def exponential_kernel_noise(x, dt, tau, gain=1.0, taps=None):
+    return ExponentialFilter(dt, tau, gain, taps).process(x)
+
+
+
+# Ornstein-Uhlenbeck process with correlation time tau and stationary standard deviation sigma:
+# Exact discretization x[n+1] = a*x[n] + sigma*sqrt(1 - a^2)*w[n], a = exp(-dt/tau), started in the stationary state
+class OrnsteinUhlenbeckFilter:
+    def __init__(self, dt, tau, sigma=1.0, x0=None, rng=None):
+        self.decay = np.exp(-dt / tau)
+        self.innovation = sigma * np.sqrt(1 - self.decay**2)
+        self.rng = _rng(rng)
+        x0 = sigma * self.rng.standard_normal() if x0 is None else x0
+        self.state = np.array([self.decay * x0])
+
+    def process(self, white):      # white: unit variance white noise
+        y, self.state = _signal().lfilter([self.innovation], [1.0, -self.decay], white, zi=self.state)
+        return y
+
+    def generate(self, n):
+        return self.process(self.rng.standard_normal(n))
+
+
+def ornstein_uhlenbeck_noise(n, dt, tau, sigma=1.0, x0=None, rng=None):
+    return OrnsteinUhlenbeckFilter(dt, tau, sigma, x0, rng).generate(n)
+
+
+
+# Arbitrary causal kernel, streaming overlap-add:
+class FIRFilter:
+    def __init__(self, kernel):
+        self.kernel = np.asarray(kernel, dtype=np.float64)
+        self.tail = np.zeros(max(self.kernel.size - 1, 0))     # Contribution of earlier chunks to the next samples
+
+    def process(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        if self.kernel.size <= direct_convolution_taps or x.size <= direct_convolution_taps:
+            full = np.convolve(x, self.kernel)
+        else:
+            full = _signal().oaconvolve(x, self.kernel)
+
+        overlap = min(self.tail.size, x.size)
+        output = full[:x.size]
+        output[:overlap] += self.tail[:overlap]
+        tail = full[x.size:].copy()
+        tail[:self.tail.size - overlap] += self.tail[overlap:]     # Part of the old tail beyond this chunk, if the chunk is shorter than the kernel
+        self.tail = tail
+        return output
+
+
+
+# Same result as np.convolve(x, kernel)[:len(x)], with the fastest method for the kernel length:
+def colored_noise(x, kernel):
+    return FIRFilter(kernel).process(x)
+
+
+
+# Noise with a one-sided power spectral density psd(f) [units^2/Hz], by shaping white noise in the frequency domain:
+# |H(f)|^2 = psd(f)/(2*dt) turns unit variance white noise (one-sided PSD 2*dt) into noise with the requested PSD
+# The record is periodic (circular convolution); for streaming use psd_kernel() with FIRFilter instead
+def psd_noise(n, dt, psd, rng=None):
+    frequencies = np.fft.rfftfreq(n, dt)
+    shaping = np.sqrt(np.maximum(psd(frequencies), 0) / (2 * dt))
+    return np.fft.irfft(np.fft.rfft(_rng(rng).standard_normal(n)) * shaping, n)
+
+
+# Causal FIR kernel with taps samples whose response approximates psd(f), for streaming PSD noise with FIRFilter:
+def psd_kernel(psd, dt, taps):
+    frequencies = np.fft.rfftfreq(taps, dt)
+    shaping = np.sqrt(np.maximum(psd(frequencies), 0) / (2 * dt))
+    kernel = np.fft.fftshift(np.fft.irfft(shaping, taps))     # Zero phase response, centered
+    return kernel * np.hanning(taps)
+
+
+
+# Stream of noise chunks from a filter; the filter state is carried, so the chunks join seamlessly
+# For OrnsteinUhlenbeckFilter the white input is drawn from the filter's own generator
+def noise_chunks(noise_filter, chunk_size, n_chunks=None, rng=None, sigma=1.0):
+    rng = getattr(noise_filter, "rng", None) or _rng(rng)
+    k = 0
+    while n_chunks is None or k < n_chunks:
+        yield noise_filter.process(sigma * rng.standard_normal(chunk_size))
+        k += 1
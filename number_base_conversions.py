@@ -1,18 +1,196 @@
+# Number Base Conversions
+
+# Converts integers to and from digits in any base 2-36 (digits 0-9 then a-z):
+#   - NumPy integer arrays (up to 64 bit) are converted all at once, one vectorized divmod per digit position, to
+#     digit matrices (values.shape + (width,), most significant digit first) or fixed-width byte strings (dtype "S<width>")
+#   - Python ints of any size (object arrays) are converted exactly with integer arithmetic (no float division, exact
+#     above 2^53)
+# The reverse parse takes digit matrices, byte/str arrays or a single string. It returns uint64, or an object array of
+# Python ints when a value doesn't fit in 64 bits. Everything returns values, nothing prints.
+#
+# Usage:
+#   to_digits(np.array([5, 255]), base=2)               # [[0 0 0 0 0 1 0 1], [1 1 1 1 1 1 1 1]]
+#   codes = to_strings(counters, base=16, width=16)     # array([b'00000000000000ff', ...], dtype='|S16')
+#   from_strings(codes, base=16)                        # back to uint64
+#   int_to_string(2**100 + 1, base=36), decimal2binary(1999)
+
+
+import numpy as np
+
+
+digit_characters = "0123456789abcdefghijklmnopqrstuvwxyz"
+_character_codes = np.frombuffer(digit_characters.encode(), dtype=np.uint8)
+_digit_values = np.full(256, 255, dtype=np.uint8)    # Digit value of every byte, 255 where it is not a digit
+_digit_values[_character_codes] = np.arange(36)
+_digit_values[np.frombuffer(digit_characters.upper().encode(), dtype=np.uint8)] = np.arange(36)
+
+
+
+def _check_base(base):
+    if not 2 <= base <= 36:
+        raise ValueError("base must be in 2..36, not " + str(base))
+
+
+def _unsigned(values):
+    values = np.asarray(values)
+    if values.dtype.kind not in "iub":
+        raise TypeError("Expected an integer array, not " + str(values.dtype))
+    if values.dtype.kind == "i" and values.size and values.min() < 0:
+        raise ValueError("Negative values can't be converted, convert the absolute values and keep the sign")
+    return values.astype(np.uint64)
+
+
+# Number of digits of the largest value (at least 1):
+def digits_needed(max_value, base=2):
+    _check_base(base)
+    width = 1
+    max_value = int(max_value)
+    while max_value >= base**width:
+        width += 1
+    return width
+
+
+# Zero padded str digits of an object array of Python ints, and their width:
+def _object_strings(values, base, width):
+    if any(value < 0 for value in values.ravel()):
+        raise ValueError("Negative values can't be converted, convert the absolute values and keep the sign")
+    strings = [int_to_string(int(value), base) for value in values.ravel()]
+    longest = max([len(string) for string in strings] + [1])
+    if width is None:
+        width = longest
+    elif longest > width:
+        raise OverflowError("Values don't fit in " + str(width) + " base " + str(base) + " digits")
+    return [string.rjust(width, "0") for string in strings], width
+
+
+
+# Digit matrix, values.shape + (width,), most significant digit first; width defaults to the largest value's length
+def to_digits(values, base=2, width=None):
+    _check_base(base)
+    values = np.asarray(values)
+    if values.dtype == object:      # Python ints of arbitrary size
+        strings, width = _object_strings(values, base, width)
+        characters = np.frombuffer("".join(strings).encode(), dtype=np.uint8)
+        return _digit_values[characters].reshape(values.shape + (width,))
+    values = _unsigned(values)
+    if width is None:
+        width = digits_needed(values.max() if values.size else 0, base)
+    digits = np.empty(values.shape + (width,), dtype=np.uint8)
+    remaining = values.copy()
+    for k in range(width - 1, -1, -1):
+        remaining, digits[..., k] = np.divmod(remaining, np.uint64(base))
+    if remaining.any():
+        raise OverflowError("Values don't fit in " + str(width) + " base " + str(base) + " digits")
+    return digits
+
+
+# Fixed-width, zero padded byte strings (dtype "S<width>"):
+def to_strings(values, base=2, width=None):
+    values = np.asarray(values)
+    if values.dtype == object:      # Python ints of arbitrary size
+        strings, width = _object_strings(values, base, width)
+        return np.array([string.encode() for string in strings], dtype="S" + str(width)).reshape(values.shape)
+    digits = to_digits(values, base, width)
+    return np.ascontiguousarray(_character_codes[digits]).view("S" + str(digits.shape[-1]))[..., 0]
+
+
+
+# uint64 values of digits (most significant first), and where they overflowed (None if no width can overflow)
+# Digits where present is False (string padding) are skipped
+def _accumulate(digits, base, present=None):
+    base_64 = np.uint64(base)
+    values = np.zeros(digits.shape[:-1], dtype=np.uint64)
+    overflow = np.zeros(values.shape, dtype=bool) if base**digits.shape[-1] > 2**64 else None
+    for k in range(digits.shape[-1]):
+        digit = digits[..., k].astype(np.uint64)
+        if overflow is not None:
+            wraps = values > (np.uint64(2**64 - 1) - digit) // base_64
+            overflow |= wraps if present is None else wraps & present[..., k]
+        shifted = values * base_64 + digit
+        values = shifted if present is None else np.where(present[..., k], shifted, values)
+    return values, overflow
+
+
+# Values of a digit matrix, most significant digit first:
+def from_digits(digits, base=2):
+    _check_base(base)
+    digits = np.asarray(digits)
+    if digits.size and digits.max() >= base:
+        raise ValueError("Digit out of range for base " + str(base))
+    values, overflow = _accumulate(digits, base)
+    if overflow is not None and overflow.any():     # Exact Python ints instead
+        values = np.zeros(digits.shape[:-1], dtype=object)
+        for k in range(digits.shape[-1]):
+            values = values * base + digits[..., k].astype(object)
+    return values
+
+
+# Values of byte or str strings (array or a single string); shorter strings in an array are right aligned
+def from_strings(strings, base=2):
+    _check_base(base)
+    if isinstance(strings, (str, bytes)):
+        return int(strings, base)
+    strings = np.asarray(strings)
+    if strings.dtype.kind == "U":
+        strings = np.char.encode(strings, "ascii")
+    width = strings.dtype.itemsize
+    characters = np.ascontiguousarray(strings).view(np.uint8).reshape(strings.shape + (width,))
+    present = characters != 0       # NumPy pads shorter strings with trailing NULs
+    digits = _digit_values[characters]
+    if np.any(present & (digits >= base)):
+        raise ValueError("Invalid digit for base " + str(base))
+
+    values, overflow = _accumulate(digits, base, present)
+    if overflow is not None and overflow.any():     # Exact Python ints instead
+        values = np.array([int(string or b"0", base) for string in strings.ravel()], dtype=object).reshape(strings.shape)
+    return values
+
+
+
+# Exact conversion of a Python int of any size:
+def int_to_string(n, base=2):
+    _check_base(base)
+    if n < 0:
+        return "-" + int_to_string(-n, base)
+    if base in (2, 8, 16):
+        return format(n, {2: "b", 8: "o", 16: "x"}[base])
+    # Peel off as many digits per big-int division as fit in 60 bits
+    chunk_digits = digits_needed(2**60, base) - 1
+    chunk = base**chunk_digits
+    pieces = []
+    while n >= chunk:
+        n, remainder = divmod(n, chunk)
+        pieces.append(remainder)
+    string = ""
+    for piece in [n] + pieces[::-1]:
+        digits = ""
+        while piece:
+            piece, digit = divmod(piece, base)
+            digits = digit_characters[digit] + digits
+        string += digits.rjust(0 if string == "" else chunk_digits, "0")
+    return string or "0"
+
+
+
 def reverse_list(list):
     new_list = [None] * len(list)
     for i in range(0, len(list)):
         new_list[i] = list[len(list) - i - 1]
-    print(new_list)
+    return new_list
 
+
+# Binary digits of an integer, most significant first:
 def decimal2binary(decimal):
+    if decimal < 0:
+        raise ValueError("Negative values can't be converted, convert the absolute value and keep the sign")
     num_list = []
     while(decimal !=0 ):
-        num_list += [decimal%2]
-        decimal = int(decimal/2)
+        decimal, bit = divmod(decimal, 2)
+        num_list += [bit]
     return reverse_list(num_list)
 
 
-decimal2binary(100)
-decimal2binary(77)
-decimal2binary(1999)
-
+if __name__ == "__main__":
+    print(decimal2binary(100))
+    print(decimal2binary(77))
+    print(decimal2binary(1999))
@@ -0,0 +1,197 @@
+# ODE Integration for Driven/Damped Oscillators
+
+# Steps many oscillators in parallel as state arrays, y.shape == (n_oscillators, 2) with y[:, 0] = x and y[:, 1] = v:
+#   x'' + damp_rate*x' + omega0^2*x + duffing*x^3 = force(t)
+# Every parameter may be a scalar or an array with one value per oscillator, and so may the value of force(t)
+# Integrators:
+#   - rk4():             classical fixed-step Runge-Kutta on a time grid
+#   - rk45():            adaptive Dormand-Prince 5(4), one step size shared by all oscillators (error norm over all of them)
+#   - velocity_verlet(): symplectic for conservative systems (damp_rate = 0), second order with damping (the closing
+#                        kick is evaluated at a predicted end velocity, one extra acceleration call per step)
+# The fixed-step integrators write into a preallocated buffer (out=...) of shape (n_saved, n_oscillators, 2) and can
+# keep only every decimate-th step, so long runs don't have to store every step
+#
+# Usage:
+#   rhs = oscillator_rhs(damp_rate=1.0, omega0=natural_frequency(1.0, 5.0), force=sampled_force(t, s))
+#   trajectory = rk4(rhs, np.zeros((1000, 2)), t, decimate=10)
+
+
+import numpy as np
+
+from instrumentation import count, stage
+
+
+
+# Undamped natural frequency omega0 for a damped oscillation frequency omega: omega^2 = omega0^2 - damp_rate^2/4
+def natural_frequency(damp_rate, omega):
+    return np.sqrt(omega**2 + 0.25 * damp_rate**2)
+
+
+# Analytic free response with x(0) = 0, x'(0) = x0*omega, the x(t) of damped_oscillator.py:
+def underdamped_solution(t, x0, damp_rate, omega):
+    return x0 * np.exp(-0.5 * damp_rate * t) * np.sin(omega * t)
+
+
+
+# Force sampled on a time grid (e.g. the colored noise s or deltagauss()), linearly interpolated between samples:
+def sampled_force(t_samples, force_samples):
+    t_samples = np.asarray(t_samples, dtype=np.float64)
+    force_samples = np.asarray(force_samples, dtype=np.float64)
+
+    def force(t):
+        if force_samples.ndim == 1:
+            return np.interp(t, t_samples, force_samples, left=0.0, right=0.0)
+        # One force record per oscillator, force_samples.shape == (n_oscillators, n_samples)
+        k = np.clip(np.searchsorted(t_samples, t) - 1, 0, t_samples.size - 2)
+        fraction = (t - t_samples[k]) / (t_samples[k + 1] - t_samples[k])
+        inside = (t >= t_samples[0]) & (t <= t_samples[-1])
+        return inside * ((1 - fraction) * force_samples[:, k] + fraction * force_samples[:, k + 1])
+
+    return force
+
+
+
+# Acceleration and right hand side of the oscillator equation:
+def oscillator_acceleration(damp_rate, omega0, duffing=0.0, force=None):
+    omega0_squared = np.asarray(omega0, dtype=np.float64)**2
+
+    def acceleration(t, x, v):
+        a = -damp_rate * v - omega0_squared * x
+        if np.any(duffing != 0):
+            a = a - duffing * x**3
+        if force is not None:
+            a = a + force(t)
+        return a
+
+    return acceleration
+
+
+def oscillator_rhs(damp_rate, omega0, duffing=0.0, force=None):
+    acceleration = oscillator_acceleration(damp_rate, omega0, duffing, force)
+
+    def rhs(t, y):
+        dy = np.empty_like(y)
+        dy[:, 0] = y[:, 1]
+        dy[:, 1] = acceleration(t, y[:, 0], y[:, 1])
+        return dy
+
+    return rhs
+
+
+
+def _output_buffer(out, n_steps, decimate, shape):
+    n_saved = (n_steps - 1) // decimate + 1
+    if out is None:
+        return np.empty((n_saved,) + shape)
+    if out.shape != (n_saved,) + shape:
+        raise ValueError("out must have shape " + str((n_saved,) + shape) + ", not " + str(out.shape))
+    return out
+
+
+
+# Classical fourth order Runge-Kutta on the time grid t, saving every decimate-th step (t[::decimate]):
+def rk4(rhs, y0, t, out=None, decimate=1):
+    t = np.asarray(t, dtype=np.float64)
+    y = np.array(y0, dtype=np.float64)
+    out = _output_buffer(out, t.size, decimate, y.shape)
+    out[0] = y
+
+    with stage("ode.rk4", y=y, steps=t.size - 1, out=out):
+        for k in range(t.size - 1):
+            h = t[k + 1] - t[k]
+            k1 = rhs(t[k], y)
+            k2 = rhs(t[k] + 0.5 * h, y + (0.5 * h) * k1)
+            k3 = rhs(t[k] + 0.5 * h, y + (0.5 * h) * k2)
+            k4 = rhs(t[k] + h, y + h * k3)
+            y += (h / 6) * (k1 + 2 * k2 + 2 * k3 + k4)
+            if (k + 1) % decimate == 0:
+                out[(k + 1) // decimate] = y
+    count("ode.rhs_evaluations", 4 * (t.size - 1))
+    return out
+
+
+
+# Velocity Verlet (kick-drift-kick) with acceleration(t, x, v) from oscillator_acceleration():
+# velocity_dependent=False skips the end velocity prediction when the acceleration doesn't depend on v (no damping)
+def velocity_verlet(acceleration, x0, v0, t, out=None, decimate=1, velocity_dependent=True):
+    t = np.asarray(t, dtype=np.float64)
+    x = np.array(x0, dtype=np.float64)
+    v = np.array(v0, dtype=np.float64)
+    out = _output_buffer(out, t.size, decimate, x.shape + (2,))
+    out[0, ..., 0], out[0, ..., 1] = x, v
+    a = acceleration(t[0], x, v)
+
+    with stage("ode.velocity_verlet", x=x, steps=t.size - 1, out=out):
+        for k in range(t.size - 1):
+            h = t[k + 1] - t[k]
+            v_half = v + (0.5 * h) * a
+            x += h * v_half
+            a = acceleration(t[k + 1], x, v_half)
+            if velocity_dependent:      # Damping at v(t + h) instead of v_half, which would make the method first order
+                a = acceleration(t[k + 1], x, v_half + (0.5 * h) * a)
+            v = v_half + (0.5 * h) * a
+            if (k + 1) % decimate == 0:
+                out[(k + 1) // decimate, ..., 0], out[(k + 1) // decimate, ..., 1] = x, v
+    count("ode.rhs_evaluations", t.size + (t.size - 1) * velocity_dependent)
+    return out
+
+
+
+# Dormand-Prince 5(4) coefficients:
+_dp_c = np.array([0, 1/5, 3/10, 4/5, 8/9, 1, 1])
+_dp_a = [
+    [],
+    [1/5],
+    [3/40, 9/40],
+    [44/45, -56/15, 32/9],
+    [19372/6561, -25360/2187, 64448/6561, -212/729],
+    [9017/3168, -355/33, 46732/5247, 49/176, -5103/18656],
+    [35/384, 0, 500/1113, 125/192, -2187/6784, 11/84],
+]
+_dp_b = np.array([35/384, 0, 500/1113, 125/192, -2187/6784, 11/84, 0])
+_dp_b_star = np.array([5179/57600, 0, 7571/16695, 393/640, -92097/339200, 187/2100, 1/40])
+
+
+# Adaptive Dormand-Prince, the steps are shortened to land exactly on every time in t_eval:
+def rk45(rhs, y0, t_eval, rtol=1e-8, atol=1e-10, first_step=None, max_steps=10**7, out=None):
+    t_eval = np.asarray(t_eval, dtype=np.float64)
+    y = np.array(y0, dtype=np.float64)
+    out = _output_buffer(out, t_eval.size, 1, y.shape)
+    out[0] = y
+
+    t = t_eval[0]
+    h = first_step if first_step is not None else (t_eval[-1] - t_eval[0]) * 1e-4
+    stages = np.empty((7,) + y.shape)
+    stages[0] = rhs(t, y)   # First same as last: stage 7 of a step is stage 1 of the next
+    steps = 0
+    evaluations = 1
+
+    for k in range(1, t_eval.size):
+        while t < t_eval[k]:
+            if steps >= max_steps:
+                raise RuntimeError("rk45 exceeded max_steps = " + str(max_steps) + " at t = " + str(t))
+            truncated = h >= t_eval[k] - t
+            step = t_eval[k] - t if truncated else h
+            for i in range(1, 6):
+                stages[i] = rhs(t + _dp_c[i] * step, y + step * np.tensordot(_dp_a[i], stages[:i], axes=1))
+            y_new = y + step * np.tensordot(_dp_b[:6], stages[:6], axes=1)     # _dp_a[6] == _dp_b[:6]
+            stages[6] = rhs(t + step, y_new)
+            evaluations += 6        # Stages 2-7 of every attempted step, rejected ones included
+            error = step * (np.tensordot(_dp_b[:6] - _dp_b_star[:6], stages[:6], axes=1) - _dp_b_star[6] * stages[6])
+            scale = atol + rtol * np.maximum(np.abs(y), np.abs(y_new))
+            error_norm = np.sqrt(np.mean((error / scale)**2))    # Shared by all oscillators
+            steps += 1
+
+            new_h = step * min(5.0, max(0.2, 0.9 * error_norm**(-0.2) if error_norm > 0 else 5.0))
+            if error_norm <= 1:
+                t = t_eval[k] if truncated else t + step    # Land exactly on the output time
+                y = y_new
+                stages[0] = stages[6]
+                h = max(h, new_h) if truncated else new_h   # A step shortened to hit t_eval says nothing about h
+            else:
+                h = new_h
+        out[k] = y
+
+    count("ode.rhs_evaluations", evaluations)
+    count("ode.rk45_steps", steps)
+    return out
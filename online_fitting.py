@@ -0,0 +1,131 @@
+# Streaming (Online) Least Squares Fitting
+
+# Fits continuously acquired time series chunk by chunk, with memory and work per chunk independent of how much data
+# has already been seen (nothing but the current chunk and a k x k information matrix per trace is kept):
+#   - OnlineLinearFitter: exact sufficient statistics (X^T W X, X^T W y, y^T W y) for linear-in-parameters models,
+#     e.g. basis_model(lambda t: t) for velocity(t, p) = p*t; the estimate equals the batch fit of all data so far
+#   - OnlineSineFitter: recursive (iterated, information-form) Gauss-Newton for p[0]*sin(2*pi*t/p[1] + p[2]); each chunk
+#     is combined with the information matrix of everything before it, so the estimate is refined as data arrives
+# Both take chunks (t_chunk, y_chunk) with y_chunk of shape (points,) or (points, traces), like batch_fitting.py
+# forgetting < 1 down-weights old data exponentially, so slowly drifting parameters can be tracked
+#
+# Usage:
+#   fitter = OnlineSineFitter()
+#   for estimate in stream_fit(chunks, fitter):          # chunks yields (t_chunk, y_chunk)
+#       print(estimate["parameters"])
+#   async for estimate in stream_fit_async(async_chunks, fitter): ...
+
+
+import numpy as np
+
+from batch_fitting import _traces_first, sine_signal_batch, sine_jacobian_batch, sine_initial_guess
+
+
+
+# Online fit of a linear-in-parameters model, jacobian(t, p) is the design matrix (see batch_fitting.basis_model):
+class OnlineLinearFitter:
+    def __init__(self, jacobian, n_parameters, forgetting=1.0):
+        self.jacobian = jacobian
+        self.n_parameters = n_parameters
+        self.forgetting = forgetting
+        self.normal_matrix = None   # (traces, k, k) X^T W X
+        self.moment = None          # (traces, k)    X^T W y
+        self.sum_of_squares = None  # (traces,)      y^T W y
+        self.n_points = 0
+
+    def update(self, t, y, sigma=None):
+        t, y, weights = _traces_first(t, y, sigma)
+        n_traces = y.shape[0]
+        design = np.broadcast_to(self.jacobian(t, np.zeros((t.shape[0], self.n_parameters))), y.shape + (self.n_parameters,))
+        weighted_design = design * weights[..., None]
+        weighted_y = y * weights
+
+        if self.normal_matrix is None:
+            self.normal_matrix = np.zeros((n_traces, self.n_parameters, self.n_parameters))
+            self.moment = np.zeros((n_traces, self.n_parameters))
+            self.sum_of_squares = np.zeros(n_traces)
+        self.normal_matrix = self.forgetting * self.normal_matrix + weighted_design.transpose(0, 2, 1) @ weighted_design
+        self.moment = self.forgetting * self.moment + (weighted_design.transpose(0, 2, 1) @ weighted_y[..., None])[..., 0]
+        self.sum_of_squares = self.forgetting * self.sum_of_squares + np.einsum("ij,ij->i", weighted_y, weighted_y)
+        self.n_points += y.shape[1]
+        return self.estimate()
+
+    def estimate(self):
+        inverse_normal_matrix = np.linalg.pinv(self.normal_matrix)
+        parameters = (inverse_normal_matrix @ self.moment[..., None])[..., 0]
+        cost = np.maximum(self.sum_of_squares - np.einsum("ik,ik->i", parameters, self.moment), 0)    # Residual sum of squares at the solution
+        degrees_of_freedom = max(self.n_points - self.n_parameters, 1)
+        return {
+            "parameters": parameters,
+            "covariance": inverse_normal_matrix * (cost / degrees_of_freedom)[:, None, None],
+            "cost": cost,
+            "n_points": self.n_points,
+        }
+
+
+
+# Online fit of p[0]*sin(2*pi*t/p[1] + p[2]):
+# Without p0 the first chunk gives the starting point through sine_initial_guess(), so it should span at least a
+# couple of periods. Every chunk then takes iterations_per_chunk Gauss-Newton steps on
+#   (p - p_previous)^T Lambda_previous (p - p_previous) + |y_chunk - f(t_chunk, p)|^2
+# and the information matrix Lambda is updated with J^T J of the chunk.
+class OnlineSineFitter:
+    def __init__(self, p0=None, forgetting=1.0, iterations_per_chunk=3):
+        self.parameters = None if p0 is None else np.atleast_2d(np.asarray(p0, dtype=np.float64)).copy()
+        self.forgetting = forgetting
+        self.iterations_per_chunk = iterations_per_chunk
+        self.information = None     # (traces, 3, 3)
+        self.cost = None
+        self.n_points = 0
+
+    def update(self, t, y, sigma=None):
+        if self.parameters is None:
+            self.parameters = sine_initial_guess(t, y)
+        t, y, weights = _traces_first(t, y, sigma)
+        n_traces = y.shape[0]
+        if self.parameters.shape[0] != n_traces:
+            self.parameters = np.repeat(self.parameters, n_traces, axis=0)
+        if self.information is None:
+            self.information = np.zeros((n_traces, 3, 3))
+            self.cost = np.zeros(n_traces)
+
+        prior_information = self.forgetting * self.information
+        prior_parameters = self.parameters
+        parameters = prior_parameters.copy()
+        for _ in range(self.iterations_per_chunk):
+            J = sine_jacobian_batch(t, parameters) * weights[..., None]
+            residual = (y - sine_signal_batch(t, parameters)) * weights
+            JT = J.transpose(0, 2, 1)
+            information = prior_information + JT @ J
+            gradient = (JT @ residual[..., None])[..., 0] - (prior_information @ (parameters - prior_parameters)[..., None])[..., 0]
+            parameters = parameters + (np.linalg.pinv(information) @ gradient[..., None])[..., 0]
+
+        J = sine_jacobian_batch(t, parameters) * weights[..., None]
+        residual = (y - sine_signal_batch(t, parameters)) * weights
+        self.information = prior_information + J.transpose(0, 2, 1) @ J
+        self.cost = self.forgetting * self.cost + np.einsum("ij,ij->i", residual, residual)
+        self.parameters = parameters
+        self.n_points += y.shape[1]
+        return self.estimate()
+
+    def estimate(self):
+        degrees_of_freedom = max(self.n_points - 3, 1)
+        return {
+            "parameters": self.parameters.copy(),
+            "covariance": np.linalg.pinv(self.information) * (self.cost / degrees_of_freedom)[:, None, None],
+            "cost": self.cost.copy(),
+            "n_points": self.n_points,
+        }
+
+
+
+# Feed chunks (t_chunk, y_chunk) from any iterable/generator to a fitter and yield the updated estimate after each:
+def stream_fit(chunks, fitter):
+    for t_chunk, y_chunk in chunks:
+        yield fitter.update(t_chunk, y_chunk)
+
+
+# Same for an async iterator, e.g. an acquisition coroutine:
+async def stream_fit_async(chunks, fitter):
+    async for t_chunk, y_chunk in chunks:
+        yield fitter.update(t_chunk, y_chunk)
@@ -0,0 +1,112 @@
+# Damped Oscillator Ensemble Simulator
+
+# Monte-Carlo ensembles of the noisy damped oscillator of damped_oscillator.py, x(t) + s(t) with
+#   x(t) = x0*exp(-damp_rate*t/2)*sin(omega*t)   and s(t) exponentially correlated noise (noise_generation.py)
+# Realizations are generated as (realizations, time) blocks of at most chunk_size realizations, and every block is
+# reduced right away to mergeable statistics (count, mean, M2 per time sample and the summed periodogram), so memory is
+# bounded by one block whatever the ensemble size.
+# x0, damp_rate and omega may be scalars or arrays with one value per realization (parameter ensembles).
+# Block k always draws its noise from the k-th stream spawned from SeedSequence(seed), so the statistics are reproducible
+# and identical whether the blocks run serially or on a process pool.
+#
+# Usage:
+#   stats = simulate_ensemble(10000, np.arange(0, 10, 0.001), x0=1, damp_rate=1, omega=5, seed=1)
+#   stats["mean"], stats["std"], stats["psd_frequencies"], stats["psd"]
+
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from noise_generation import exponential_kernel_noise
+
+
+
+# Closed-form underdamped response, vectorized over realizations (parameters of shape (realizations, 1)):
+def damped_response(t, x0, damp_rate, omega):
+    return x0 * np.exp(-0.5 * damp_rate * t) * np.sin(omega * t)
+
+
+
+def _column(value, start, stop):   # Scalar, or the rows [start, stop) of a per-realization array as a column
+    value = np.asarray(value, dtype=np.float64)
+    return value if value.ndim == 0 else value[start:stop, None]
+
+
+
+# Statistics of one block of realizations:
+def _simulate_block(task):
+    t, start, stop, x0, damp_rate, omega, noise_tau, noise_gain, noise_taps, seed_sequence = task
+    rng = np.random.default_rng(seed_sequence)
+    dt = t[1] - t[0]
+
+    realizations = np.empty((stop - start, t.size))
+    realizations[:] = damped_response(t, _column(x0, start, stop), _column(damp_rate, start, stop), _column(omega, start, stop))
+    if noise_gain != 0:
+        realizations += exponential_kernel_noise(rng.standard_normal(realizations.shape), dt, noise_tau, noise_gain, noise_taps)
+
+    mean = realizations.mean(axis=0)
+    m2 = ((realizations - mean)**2).sum(axis=0)
+    periodogram_sum = (np.abs(np.fft.rfft(realizations, axis=1))**2).sum(axis=0)
+    return realizations.shape[0], mean, m2, periodogram_sum
+
+
+
+# Chan et al. pairwise merge of (count, mean, M2) statistics:
+def merge_statistics(a, b):
+    count_a, mean_a, m2_a, periodogram_a = a
+    count_b, mean_b, m2_b, periodogram_b = b
+    count = count_a + count_b
+    delta = mean_b - mean_a
+    mean = mean_a + delta * (count_b / count)
+    m2 = m2_a + m2_b + delta**2 * (count_a * count_b / count)
+    return count, mean, m2, periodogram_a + periodogram_b
+
+
+
+def simulate_ensemble(n_realizations, t, x0=1.0, damp_rate=1.0, omega=5.0, noise_tau=0.05, noise_gain=10.0,
+                      noise_taps=1000, seed=None, chunk_size=256, processes=1):
+    if n_realizations < 1:
+        raise ValueError("n_realizations must be at least 1, not " + str(n_realizations))
+    t = np.asarray(t, dtype=np.float64)
+    seed_sequence = np.random.SeedSequence(seed)
+    starts = list(range(0, n_realizations, chunk_size))
+    streams = seed_sequence.spawn(len(starts))
+    tasks = [(t, start, min(start + chunk_size, n_realizations), x0, damp_rate, omega, noise_tau, noise_gain, noise_taps, stream)
+             for start, stream in zip(starts, streams)]
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if processes == 1 or len(tasks) <= 1:
+        block_statistics = map(_simulate_block, tasks)
+    else:
+        executor = ProcessPoolExecutor(max_workers=processes)
+        block_statistics = executor.map(_simulate_block, tasks)
+
+    try:
+        statistics = None
+        for block in block_statistics:     # Merged in block order, so the result does not depend on processes
+            statistics = block if statistics is None else merge_statistics(statistics, block)
+    finally:
+        if processes != 1 and len(tasks) > 1:
+            executor.shutdown()
+
+    count, mean, m2, periodogram_sum = statistics
+    dt = t[1] - t[0]
+    psd = periodogram_sum * (2 * dt / (t.size * count))     # One-sided PSD averaged over the realizations
+    psd[0] /= 2
+    if t.size % 2 == 0:
+        psd[-1] /= 2
+    variance = m2 / max(count - 1, 1)
+
+    return {
+        "t": t,
+        "n_realizations": count,
+        "mean": mean,
+        "variance": variance,
+        "std": np.sqrt(variance),
+        "psd_frequencies": np.fft.rfftfreq(t.size, dt),
+        "psd": psd,
+        "seed_entropy": seed_sequence.entropy,     # Pass back as seed to reproduce the ensemble
+    }
@@ -0,0 +1,144 @@
+# Parallel CSV Ingestion
+
+# Reads one numeric column of a large CSV file on all cores:
+#   - the file is memory-mapped and split into byte ranges that start and end on line boundaries (only a few bytes
+#     around each split point are looked at, the file is never read through Python file objects)
+#   - every range is parsed by a worker process, which maps the file itself and hands blocks of block_bytes straight
+#     from the mapping to a C parser (pandas if available, np.loadtxt otherwise); the block slice is the only copy made
+#     before the numeric conversion, no per-row Python strings or float() calls
+#   - each worker reduces its range to a RunningStatistics (streaming_statistics.py), and the partial aggregates are
+#     merged in file order, so the result does not depend on the number of processes
+# Like csv_statistics(), column is a header name (the file has a header line) or a column index (no header)
+#
+# Usage:
+#   stats = parallel_csv_statistics("random_data.csv", column="normal", bins=np.linspace(-1, 1, 101), processes=8)
+#   values = parallel_csv_column("random_data.csv", column="normal")
+
+
+import io
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from instrumentation import count, stage
+from streaming_statistics import RunningStatistics
+
+
+default_block_bytes = 2**26     # Bytes handed to the parser at a time, bounds the memory of every worker
+
+
+
+def _map_file(file):
+    return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+# Start of the first line beginning at or after position:
+def _line_start(mapped, position, stop):
+    if position <= 0:
+        return 0
+    newline = mapped.find(b"\n", position - 1, stop)
+    return stop if newline < 0 else newline + 1
+
+
+# Header line as a list of column names, and the offset of the first data line:
+def _header(mapped, delimiter):
+    end = _line_start(mapped, 1, len(mapped))
+    names = mapped[:end].decode().strip().split(delimiter)
+    return [name.strip().strip('"') for name in names], end
+
+
+def _column_index(mapped, column, delimiter):
+    if not isinstance(column, str):
+        return column, 0
+    names, data_start = _header(mapped, delimiter)
+    if column not in names:
+        raise ValueError("Column " + repr(column) + " not in the header " + repr(names))
+    return names.index(column), data_start
+
+
+
+# Byte ranges [start, stop) splitting the data lines into at most n_ranges pieces of about equal size:
+def newline_aligned_ranges(file_name, n_ranges, header=False):
+    if os.path.getsize(file_name) == 0:
+        return []
+    with open(file_name, "rb") as file, _map_file(file) as mapped:
+        size = len(mapped)
+        first = _line_start(mapped, 1, size) if header else 0
+        boundaries = [first]
+        for k in range(1, n_ranges):
+            boundaries.append(max(_line_start(mapped, first + (size - first) * k // n_ranges, size), boundaries[-1]))
+        boundaries.append(size)
+    return [(start, stop) for start, stop in zip(boundaries[:-1], boundaries[1:]) if stop > start]
+
+
+
+def _parse_block(block, column, delimiter):
+    try:
+        import pandas
+    except ImportError:
+        return np.loadtxt(io.BytesIO(block), delimiter=delimiter, usecols=column, dtype=np.float64, ndmin=1)
+    frame = pandas.read_csv(io.BytesIO(block), header=None, usecols=[column], sep=delimiter, dtype=np.float64,
+                            float_precision="round_trip")       # Exact parsing, same values as np.loadtxt
+    return frame[column].to_numpy()
+
+
+# Float arrays of one column of the lines in [start, stop), block_bytes at a time:
+def _range_chunks(file_name, start, stop, column, delimiter, block_bytes):
+    with open(file_name, "rb") as file, _map_file(file) as mapped:
+        while start < stop:
+            end = _line_start(mapped, min(start + block_bytes, stop), stop)
+            block = mapped[start:end]
+            start = end
+            if block.strip():
+                yield _parse_block(block, column, delimiter)
+
+
+def _range_statistics(task):
+    file_name, start, stop, column, delimiter, block_bytes, bins = task
+    statistics = RunningStatistics(bins)
+    for values in _range_chunks(file_name, start, stop, column, delimiter, block_bytes):
+        statistics.update(values)
+    return statistics
+
+
+def _range_values(task):
+    file_name, start, stop, column, delimiter, block_bytes = task[:6]
+    chunks = list(_range_chunks(file_name, start, stop, column, delimiter, block_bytes))
+    return np.concatenate(chunks) if chunks else np.empty(0)
+
+
+
+# Runs worker(task) for every byte range of the file and returns the results in file order:
+def _map_ranges(worker, file_name, column, delimiter, processes, block_bytes, *extra):
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if os.path.getsize(file_name) == 0:
+        return []
+    with open(file_name, "rb") as file, _map_file(file) as mapped:
+        column, data_start = _column_index(mapped, column, delimiter)
+    ranges = newline_aligned_ranges(file_name, processes, header=data_start > 0)
+    tasks = [(file_name, start, stop, column, delimiter, block_bytes) + extra for start, stop in ranges]
+
+    if processes == 1 or len(tasks) <= 1:
+        return list(map(worker, tasks))
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(worker, tasks))
+
+
+
+# Statistics of one column, same result as csv_statistics() (up to rounding of the merged mean/M2):
+def parallel_csv_statistics(file_name, column=0, bins=None, processes=None, delimiter=",", block_bytes=default_block_bytes):
+    statistics = RunningStatistics(bins)
+    with stage("csv.parallel_statistics", file_name=file_name, processes=processes):
+        for part in _map_ranges(_range_statistics, file_name, column, delimiter, processes, block_bytes, statistics.bin_edges):
+            count("csv.values", part.count)     # Non-empty values, the workers are not traced
+            statistics._merge_in_place(part)
+    return statistics
+
+
+# The whole column as one float array, parsed in parallel:
+def parallel_csv_column(file_name, column=0, processes=None, delimiter=",", block_bytes=default_block_bytes):
+    parts = _map_ranges(_range_values, file_name, column, delimiter, processes, block_bytes)
+    return np.concatenate(parts) if parts else np.empty(0)
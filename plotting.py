@@ -0,0 +1,58 @@
+# Plotting
+
+# Optional renderer for the figures of the scripts, kept apart from the compute modules, which import with NumPy only
+# matplotlib is imported on first use; by default with the non-interactive Agg backend, and every figure is written
+# to a file, so the scripts run on headless nodes. --show restores the interactive windows.
+#
+# Usage:
+#   renderer = renderer_from_arguments()        # python script.py [--show] [--output-dir figures] [--format png]
+#   renderer.pyplot.plot(t, x)
+#   renderer.save("oscillator")                 # figures/oscillator.png, or a window with --show
+
+
+import argparse
+import os
+
+
+
+class FigureRenderer:
+    def __init__(self, output_dir="figures", show=False, file_format="png", dpi=150):
+        self.output_dir = output_dir
+        self.show = show
+        self.file_format = file_format
+        self.dpi = dpi
+        self.saved = []         # Paths of the written figures
+        self._pyplot = None
+
+    @property
+    def pyplot(self):
+        if self._pyplot is None:
+            import matplotlib
+            if not self.show:
+                matplotlib.use("Agg")
+            from matplotlib import pyplot
+            self._pyplot = pyplot
+        return self._pyplot
+
+    # Write (or show) the current figure and start a new one:
+    def save(self, name):
+        pyplot = self.pyplot
+        if self.show:
+            pyplot.show()
+            return None
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, name + "." + self.file_format)
+        pyplot.savefig(path, dpi=self.dpi)
+        pyplot.close("all")
+        self.saved.append(path)
+        return path
+
+
+
+def renderer_from_arguments(argv=None, description=None):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--show", action="store_true", help="show the figures interactively instead of writing files")
+    parser.add_argument("--output-dir", default="figures", help="directory the figures are written to")
+    parser.add_argument("--format", default="png", help="file format of the figures (png, pdf, svg, ...)")
+    arguments = parser.parse_args(argv)
+    return FigureRenderer(arguments.output_dir, arguments.show, arguments.format)
@@ -1,7 +1,243 @@
+# Perfect, Abundant and Deficient Numbers
+
+# n is perfect, abundant or deficient when the sum of its proper divisors s(n) = sigma(n) - n equals, exceeds or is
+# less than n (1 has no proper divisors, s(1) = 0, so it is deficient)
+#   - single numbers: sigma(n) from the prime factorization by trial division, O(sqrt(n))
+#   - ranges: a segmented multiplicative sieve; for every base prime p <= sqrt(stop) the multiples of p, p^2, ... in a
+#     segment are strided slices, which accumulate sigma(p^e) = 1 + p + ... + p^e and divide p out of a residual, and
+#     a residual > 1 left at the end is one prime factor above sqrt(stop). A segment of m numbers works on int64 arrays
+#     (n, residual, sigma and temporaries), about 36 bytes per number: ~36 MB at the default m = 2^20, which is larger
+#     than the CPU caches. Smaller segments use less memory but repeat the Python loop over the base primes more often
+#     (2^16 is 5x slower near 10^10), so the default trades memory for throughput; pass segment_size to change it.
+# Classifications are uint8 codes (deficient, perfect, abundant = 0, 1, 2), so all n <= 10^8 take 100 MB
+# With processes != 1 the segments are scheduled on a process pool; the base primes are put in shared memory once,
+# at most a few segments per worker are in flight, and the results stream back in order, as codes or as counts only.
+# Every worker sieves one segment at a time (~36 bytes per number each), and up to segments_in_flight * processes
+# results (segment_size bytes of codes each, or a few integers of counts) wait in the parent, so the total memory
+# grows with the number of processes
+# proper_divisors() is the interactive front end, it only runs when the file is executed as a script
+#
+# Usage:
+#   classify(28)                                   # perfect
+#   codes = classify_range(1, 10**6)               # codes[n - 1] for n = 1, ..., 10^6 - 1
+#   counts = classification_counts(10**8)          # counts["abundant"], counts["perfect_numbers"], ...
+#   for start, codes in classification_segments(10**8): ...
+#   counts = classification_counts(10**10 + 10**9, start=10**10, processes=None)    # On all cores
+
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+deficient, perfect, abundant = 0, 1, 2
+classification_names = ("deficient", "perfect", "abundant")
+default_segment_size = 2**20     # ~36 MB of sieve arrays per segment, see above
+segments_in_flight = 4      # Per worker process, bounds the memory of results waiting to be consumed
+
+
+
+# Prime factorization by trial division, [(p, e), ...]:
+def prime_factorization(n):
+    factors = []
+    p = 2
+    while p * p <= n:
+        if n % p == 0:
+            e = 0
+            while n % p == 0:
+                n //= p
+                e += 1
+            factors.append((p, e))
+        p += 1 if p == 2 else 2
+    if n > 1:
+        factors.append((n, 1))
+    return factors
+
+
+def divisor_sum(n):
+    sigma = 1
+    for p, e in prime_factorization(n):
+        sigma *= (p**(e + 1) - 1) // (p - 1)
+    return sigma
+
+
+def proper_divisor_sum(n):
+    return divisor_sum(n) - n
+
+
+def classify(n):
+    s = proper_divisor_sum(n)
+    return perfect if s == n else (abundant if s > n else deficient)
+
+
+
+# Primes up to and including limit, sieve of Eratosthenes:
+def base_primes(limit):
+    if limit < 2:
+        return np.empty(0, dtype=np.int64)
+    is_prime = np.ones(limit + 1, dtype=bool)
+    is_prime[:2] = False
+    for p in range(2, int(limit**0.5) + 1):
+        if is_prime[p]:
+            is_prime[p * p::p] = False
+    return np.flatnonzero(is_prime).astype(np.int64)
+
+
+def _isqrt_primes(stop):
+    return base_primes(int(np.sqrt(max(stop - 1, 0))) + 1)
+
+
+
+# s(n) = sigma(n) - n for start <= n < stop, with primes containing all primes <= sqrt(stop - 1):
+def _segment_divisor_sums(start, stop, primes):
+    n = np.arange(start, stop, dtype=np.int64)
+    residual = n.copy()
+    sigma = np.ones_like(n)
+    primes = primes[primes * primes < stop]
+    for p in primes[primes < n.size]:
+        p = int(p)
+        first = (-start) % p        # Index of the first multiple of p
+        if first >= n.size:
+            continue
+        multiples = slice(first, None, p)
+        residual[multiples] //= p
+        term = np.full(residual[multiples].size, 1 + p, dtype=np.int64)     # sigma(p^e) of the multiples of p
+        power, stride = p * p, 1    # Multiples of p^k are every p^(k-1)-th multiple of p
+        while power < stop:
+            stride *= p
+            first_power = (-start) % power
+            if first_power >= n.size:
+                break
+            offset = (first_power - first) // p
+            residual[first_power::power] //= p
+            term[offset::stride] += power
+            power *= p
+        sigma[multiples] *= term
+
+    # Primes longer than the segment have at most one multiple in it, all of them at once; one n can be a multiple
+    # of several of them, so the updates go through the unbuffered ufunc.at
+    large = primes[primes >= n.size]
+    first = (-start) % large
+    p = large[first < n.size]
+    index = first[first < n.size]
+    np.floor_divide.at(residual, index, p)
+    term = 1 + p
+    power = p * p
+    divisible = n[index] % power == 0
+    while divisible.any():
+        term[divisible] += power[divisible]
+        np.floor_divide.at(residual, index[divisible], p[divisible])
+        power[divisible] *= p[divisible]
+        divisible &= n[index] % power == 0
+    np.multiply.at(sigma, index, term)
+
+    sigma[residual > 1] *= 1 + residual[residual > 1]     # One prime factor above sqrt(stop)
+    return sigma - n
+
+
+def proper_divisor_sums(start, stop, segment_size=default_segment_size):
+    start = max(start, 1)
+    primes = _isqrt_primes(stop)
+    sums = np.empty(max(stop - start, 0), dtype=np.int64)
+    for segment_start in range(start, stop, segment_size):
+        segment_stop = min(segment_start + segment_size, stop)
+        sums[segment_start - start:segment_stop - start] = _segment_divisor_sums(segment_start, segment_stop, primes)
+    return sums
+
+
+
+def _classify_segment(start, stop, primes):
+    sums = _segment_divisor_sums(start, stop, primes)
+    return (np.sign(sums - np.arange(start, stop, dtype=np.int64)) + 1).astype(np.uint8)
+
+
+# Codes of a segment, or only (counts, perfect numbers) so that just a few integers go back to the parent:
+def _segment_result(start, stop, primes, counts_only):
+    codes = _classify_segment(start, stop, primes)
+    if not counts_only:
+        return codes
+    return np.bincount(codes, minlength=3), start + np.flatnonzero(codes == perfect)
+
+
+
+# Worker side of the process pool, the base primes are a view of the parent's shared memory block:
+_worker_primes = None
+
+
+def _attach_primes(name, n_primes):
+    global _worker_primes
+    block = shared_memory.SharedMemory(name=name)
+    _worker_primes = (block, np.ndarray(n_primes, dtype=np.int64, buffer=block.buf))   # Keep the block open
+
+
+def _pool_segment(task):
+    start, stop, counts_only = task
+    return _segment_result(start, stop, _worker_primes[1], counts_only)
+
+
+def _segment_results(stop, start, segment_size, processes, counts_only):
+    start = max(start, 1)
+    primes = _isqrt_primes(stop)
+    tasks = ((segment_start, min(segment_start + segment_size, stop), counts_only)
+             for segment_start in range(start, stop, segment_size))
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if processes == 1 or stop - start <= segment_size:
+        for segment_start, segment_stop, _ in tasks:
+            yield segment_start, _segment_result(segment_start, segment_stop, primes, counts_only)
+        return
+
+    block = shared_memory.SharedMemory(create=True, size=max(primes.nbytes, 1))
+    try:
+        np.ndarray(primes.size, dtype=np.int64, buffer=block.buf)[:] = primes
+        with ProcessPoolExecutor(max_workers=processes, initializer=_attach_primes, initargs=(block.name, primes.size)) as executor:
+            pending = deque()
+            for task in tasks:
+                pending.append((task[0], executor.submit(_pool_segment, task)))
+                if len(pending) >= segments_in_flight * processes:
+                    segment_start, future = pending.popleft()
+                    yield segment_start, future.result()
+            while pending:
+                segment_start, future = pending.popleft()
+                yield segment_start, future.result()
+    finally:
+        block.close()
+        block.unlink()
+
+
+
+# Classification codes of start <= n < stop, one segment at a time:
+def classification_segments(stop, start=1, segment_size=default_segment_size, processes=1):
+    return _segment_results(stop, start, segment_size, processes, counts_only=False)
+
+
+def classify_range(start, stop, segment_size=default_segment_size, processes=1):
+    start = max(start, 1)
+    codes = np.empty(max(stop - start, 0), dtype=np.uint8)
+    for segment_start, segment_codes in classification_segments(stop, start, segment_size, processes):
+        codes[segment_start - start:segment_start - start + segment_codes.size] = segment_codes
+    return codes
+
+
+# Number of deficient, perfect and abundant n in [start, stop), and the perfect numbers themselves:
+def classification_counts(stop, start=1, segment_size=default_segment_size, processes=1):
+    counts = np.zeros(3, dtype=np.int64)
+    perfect_numbers = []
+    for _, (segment_counts, segment_perfect) in _segment_results(stop, start, segment_size, processes, counts_only=True):
+        counts += segment_counts
+        perfect_numbers.extend(segment_perfect.tolist())
+    result = dict(zip(classification_names, counts.tolist()))
+    result["perfect_numbers"] = np.array(perfect_numbers, dtype=np.int64)
+    return result
+
+
+
+# Interactive front end:
 def proper_divisors():
     m = 10
-    ret_message = ''
-    pd_accum = 1
 
     while (m >0):
         try:
@@ -10,27 +246,15 @@ def proper_divisors():
             print("Invalid input, try again\n")
             continue
 
-        for i in range(1, m-1):
-            if (m % (m-i) == 0):
-                pd_accum += (m - i)
-
-        if (pd_accum > m):
-            ret_message = "Abundant #\n"
-        if (pd_accum < m):
-            ret_message = "Deficient #\n"
-        if pd_accum == m:
-            ret_message = "Perfect #\n"
         if (m <= 0):
             ret_message = "Finished!\n"
+        else:
+            ret_message = classification_names[classify(m)].capitalize() + " #\n"
         print(ret_message)
-        pd_accum = 1
 
     if (m <= 0):
         return
 
-proper_divisors()
-
-
-
-
 
+if __name__ == "__main__":
+    proper_divisors()
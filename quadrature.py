@@ -0,0 +1,449 @@
+# Vectorized Composite Quadrature
+
+# Composite rectangle, trapezoid, Simpson, Romberg and Gauss-Legendre rules for ufunc-style integrands, and adaptive
+# Simpson and Gauss-Kronrod (G7K15) rules that refine the worst intervals until a tolerance is met
+# The integrand is called once per rule on the whole array of nodes, f(x, *args) -> array of the same shape as x,
+# so np.exp(-x**2) style functions run at NumPy speed instead of once per point through np.vectorize
+# Every rule returns (value, error_estimate), the same shape of result as scipy.integrate.quad
+# The error estimates compare against a coarser rule built from (mostly) the same function evaluations
+#
+# Usage:
+#   value, error = simpson(lambda x: np.exp(-x**2), -5, 5, n=500)
+#   value, error = integrate(lambda x: np.exp(-x**2), -5, 5, method="gauss_legendre", n=20, panels=10)
+#   study = convergence_study(lambda x: np.exp(-x**2), -5, 5, levels=20, reference=np.sqrt(np.pi))
+#   value, error, info = adaptive_gauss_kronrod(lambda x: np.exp(-x**2), -5, 5, tol=1e-10, full_output=True)
+#   values, errors = integrate_batch(lambda x, mu, sigma: np.exp(-(x - mu)**2 / (2 * sigma**2)), a_array, b_array, params=(mu_array, sigma_array))
+
+
+import functools
+import heapq
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from instrumentation import count, instrument, stage
+
+
+
+def _evaluate(f, x, args):
+    count("quadrature.evaluations", np.size(x))
+    return np.asarray(f(x, *args), dtype=np.float64)
+
+
+def _result(value, error):
+    return float(value), float(error)
+
+
+
+# Rectangle rule with n panels, point = "left", "right" or "midpoint":
+def rectangle(f, a, b, n=500, point="midpoint", args=()):
+    h = (b - a) / n
+
+    if point == "midpoint":
+        # Evaluate on the 2n+1 point Simpson grid in one call, the odd points are the midpoints
+        # Simpson's rule on the same evaluations is the error reference
+        y = _evaluate(f, np.linspace(a, b, 2*n + 1), args)
+        value = h * y[1::2].sum()
+        simpson_value = (h / 6) * (y[0] + y[-1] + 4 * y[1::2].sum() + 2 * y[2:-1:2].sum())
+        return _result(value, abs(value - simpson_value))
+
+    if point not in ("left", "right"):
+        raise ValueError("point must be 'left', 'right' or 'midpoint', not " + repr(point))
+
+    y = _evaluate(f, np.linspace(a, b, n + 1), args)
+    y = y[:-1] if point == "left" else y[1:]
+    value = h * y.sum()
+    if n < 2:
+        return _result(value, np.inf)
+    # Same rule with every other node (2h panels), the first order error halves with h
+    coarse_y = y[::2] if point == "left" else y[1::2]
+    coarse_value = 2 * h * coarse_y.sum()
+    return _result(value, abs(value - coarse_value))
+
+
+
+# Trapezoid rule with n panels:
+def trapezoid(f, a, b, n=500, args=()):
+    y = _evaluate(f, np.linspace(a, b, n + 1), args)
+    h = (b - a) / n
+    value = h * (y.sum() - 0.5 * (y[0] + y[-1]))
+    if n < 2 or n % 2 != 0:
+        # No nested 2h grid, the difference to the left rectangle rule on the same nodes is a (pessimistic) bound
+        return _result(value, abs(value - h * y[:-1].sum()))
+    coarse_y = y[::2]
+    coarse_value = 2 * h * (coarse_y.sum() - 0.5 * (coarse_y[0] + coarse_y[-1]))
+    return _result(value, abs(value - coarse_value) / 3)    # Richardson: the error of the fine rule is ~ (T_h - T_2h)/3
+
+
+
+# Simpson's rule with n panels (n is rounded up to an even number):
+def simpson(f, a, b, n=500, args=()):
+    n += n % 2
+    y = _evaluate(f, np.linspace(a, b, n + 1), args)
+    h = (b - a) / n
+    value = (h / 3) * (y[0] + y[-1] + 4 * y[1:-1:2].sum() + 2 * y[2:-1:2].sum())
+
+    if n % 4 != 0:
+        # Trapezoid on the same nodes is the error reference
+        trapezoid_value = h * (y.sum() - 0.5 * (y[0] + y[-1]))
+        return _result(value, abs(value - trapezoid_value))
+    coarse_y = y[::2]
+    coarse_value = (2 * h / 3) * (coarse_y[0] + coarse_y[-1] + 4 * coarse_y[1:-1:2].sum() + 2 * coarse_y[2:-1:2].sum())
+    return _result(value, abs(value - coarse_value) / 15)    # Richardson: the error of the fine rule is ~ (S_h - S_2h)/15
+
+
+
+# Romberg table built from the trapezoid rules of one evaluation on 2**levels panels:
+def romberg_table(y, a, b):
+    levels = int(round(np.log2(len(y) - 1)))
+    table = np.zeros((levels + 1, levels + 1))
+    for k in range(0, levels + 1):
+        stride = 2**(levels - k)    # Trapezoid with 2**k panels uses every stride-th sample
+        coarse_y = y[::stride]
+        table[k, 0] = ((b - a) / 2**k) * (coarse_y.sum() - 0.5 * (coarse_y[0] + coarse_y[-1]))
+        for j in range(1, k + 1):
+            table[k, j] = table[k, j-1] + (table[k, j-1] - table[k-1, j-1]) / (4**j - 1)
+    return table
+
+
+def romberg(f, a, b, levels=10, args=()):
+    y = _evaluate(f, np.linspace(a, b, 2**levels + 1), args)
+    table = romberg_table(y, a, b)
+    value = table[levels, levels]
+    if levels == 0:
+        return _result(value, np.inf)
+    return _result(value, abs(value - table[levels - 1, levels - 1]))
+
+
+
+# Gauss-Legendre nodes and weights on [-1, 1], cached because leggauss costs O(n^2):
+@functools.lru_cache(maxsize=64)
+def gauss_legendre_nodes(n):
+    nodes, weights = np.polynomial.legendre.leggauss(n)
+    nodes.setflags(write=False)
+    weights.setflags(write=False)
+    return nodes, weights
+
+
+def _gauss_legendre_nodes_on_panels(a, b, n, panels):
+    nodes, weights = gauss_legendre_nodes(n)
+    edges = np.linspace(a, b, panels + 1)
+    half_width = 0.5 * (edges[1:] - edges[:-1])[:, None]
+    center = 0.5 * (edges[1:] + edges[:-1])[:, None]
+    return center + half_width * nodes, half_width * weights   # Both of shape (panels, n)
+
+
+# Composite Gauss-Legendre with n nodes on each of the panels:
+def gauss_legendre(f, a, b, n=20, panels=1, args=()):
+    x, w = _gauss_legendre_nodes_on_panels(a, b, n, panels)
+    coarse_n = max(1, n // 2)
+    coarse_x, coarse_w = _gauss_legendre_nodes_on_panels(a, b, coarse_n, panels)
+
+    # One call for both rules; the n//2 node rule is the error reference
+    y = _evaluate(f, np.concatenate((x.ravel(), coarse_x.ravel())), args)
+    value = np.dot(w.ravel(), y[:x.size])
+    coarse_value = np.dot(coarse_w.ravel(), y[x.size:])
+    return _result(value, abs(value - coarse_value))
+
+
+
+quadrature_rules = {
+    "rectangle": rectangle,
+    "trapezoid": trapezoid,
+    "simpson": simpson,
+    "romberg": romberg,
+    "gauss_legendre": gauss_legendre,
+    "adaptive_simpson": None,   # Filled in below, once the adaptive rules are defined
+    "adaptive_gauss_kronrod": None,
+}
+
+
+# Common entry point, options are passed on to the chosen rule:
+def integrate(f, a, b, method="simpson", args=(), **options):
+    if method not in quadrature_rules:
+        raise ValueError("Unknown quadrature method: " + repr(method) + ", choose from " + str(sorted(quadrature_rules)))
+    with stage("quadrature." + method, **options):
+        return quadrature_rules[method](f, a, b, args=args, **options)
+
+
+
+# Convergence study on nested grids:
+# Level k is the trapezoid rule with 2**k panels. Its nodes are the nodes of level k-1 plus the 2**(k-1) midpoints,
+# so each level only evaluates the new midpoints and T_k = T_(k-1)/2 + h_k * sum(f(midpoints)).
+# The Richardson (Romberg) extrapolation of each level comes from the same table, so a study out to 2**levels panels
+# costs 2**levels + 1 evaluations in total instead of O(N^2) for rebuilding every grid from scratch.
+# Returns a dict of per-level arrays: panels, evaluations (cumulative), trapezoid, richardson, and the errors
+# against reference if one is given.
+@instrument("quadrature.convergence_study")
+def convergence_study(f, a, b, levels=20, reference=None, args=(), chunk_size=2**20):
+    panels = 2**np.arange(levels + 1)
+    evaluations = np.empty(levels + 1, dtype=np.int64)
+    trapezoid_values = np.empty(levels + 1)
+    richardson_values = np.empty(levels + 1)
+
+    previous_row = np.array([0.5 * (b - a) * _evaluate(f, np.array([a, b], dtype=np.float64), args).sum()])
+    trapezoid_values[0] = richardson_values[0] = previous_row[0]
+    evaluations[0] = 2
+
+    for k in range(1, levels + 1):
+        h = (b - a) / 2**k
+        new_points = 2**(k - 1)
+        midpoint_sum = 0.0
+        for start in range(0, new_points, chunk_size):     # Midpoints a + (2j+1)h, evaluated in memory-bounded chunks
+            j = np.arange(start, min(start + chunk_size, new_points), dtype=np.float64)
+            midpoint_sum += _evaluate(f, a + (2*j + 1) * h, args).sum()
+
+        row = np.empty(k + 1)
+        row[0] = 0.5 * previous_row[0] + h * midpoint_sum
+        for j in range(1, k + 1):
+            row[j] = row[j-1] + (row[j-1] - previous_row[j-1]) / (4**j - 1)
+
+        trapezoid_values[k] = row[0]
+        richardson_values[k] = row[k]
+        evaluations[k] = evaluations[k-1] + new_points
+        previous_row = row
+
+    study = {
+        "panels": panels,
+        "evaluations": evaluations,
+        "trapezoid": trapezoid_values,
+        "richardson": richardson_values,
+    }
+    if reference is not None:
+        study["trapezoid_error"] = np.abs(trapezoid_values - reference)
+        study["richardson_error"] = np.abs(richardson_values - reference)
+    return study
+
+
+
+# Batched integration:
+# Integrates row i of a family f(x, *params_i) over [a_i, b_i] for thousands of rows at once. Every row uses the same
+# reference nodes on [0, 1] (or [-1, 1]), so a chunk of rows is one (rows, nodes) array and one call of f.
+# params are arrays with one value per row (or scalars); f receives them as (rows, 1) columns so they broadcast against x.
+# Rows are processed in chunks of at most max_elements nodes in total to bound memory, and the chunks can be spread over a
+# process pool for expensive integrands (f must then be picklable, i.e. defined at module level, not a lambda).
+# Returns (values, errors) arrays, the errors are estimated as in gauss_legendre() and simpson().
+
+# Simpson weights 1, 4, 2, 4, ..., 4, 1 for n panels on the unit interval:
+def _simpson_weights(n):
+    w = np.ones(n + 1)
+    w[1:-1:2] = 4
+    w[2:-1:2] = 2
+    return w / (3 * n)
+
+
+# Reference nodes and weights of the fine and the coarse (error reference) rule, on the unit interval:
+@functools.lru_cache(maxsize=64)
+def _batch_rule(method, n, panels):
+    if method == "gauss_legendre":
+        rules = []
+        for order in (n, max(1, n // 2)):
+            nodes, weights = gauss_legendre_nodes(order)
+            edges = np.linspace(0, 1, panels + 1)
+            half_width = 0.5 * (edges[1:] - edges[:-1])[:, None]
+            center = 0.5 * (edges[1:] + edges[:-1])[:, None]
+            rules.append(((center + half_width * nodes).ravel(), (half_width * weights).ravel()))
+        (x, w), (coarse_x, coarse_w) = rules
+        return np.concatenate((x, coarse_x)), np.concatenate((w, np.zeros_like(coarse_w))), np.concatenate((np.zeros_like(w), coarse_w))
+
+    if method == "simpson":
+        n += n % 2
+        x = np.linspace(0, 1, n + 1)
+        w = _simpson_weights(n)
+        if n % 4 == 0:      # Simpson on every other node
+            coarse_w = np.zeros(n + 1)
+            coarse_w[::2] = _simpson_weights(n // 2)
+        else:               # Trapezoid on the same nodes
+            coarse_w = np.full(n + 1, 1.0 / n)
+            coarse_w[0] = coarse_w[-1] = 0.5 / n
+        return x, w, coarse_w
+
+    raise ValueError("Unknown batch quadrature method: " + repr(method) + ", choose 'gauss_legendre' or 'simpson'")
+
+
+def _integrate_rows(f, a, b, params, method, n, panels):
+    x, w, coarse_w = _batch_rule(method, n, panels)
+    width = (b - a)[:, None]
+    y = np.asarray(f(a[:, None] + width * x, *[param[:, None] for param in params]), dtype=np.float64)
+    count("quadrature.evaluations", y.size)
+    values = width[:, 0] * (y @ w)
+    coarse_values = width[:, 0] * (y @ coarse_w)
+    errors = np.abs(values - coarse_values)
+    if method == "simpson" and (n + n % 2) % 4 == 0:
+        errors /= 15    # Richardson, as in simpson()
+    return values, errors
+
+
+def _integrate_rows_packed(task):
+    return _integrate_rows(*task)
+
+
+@instrument("quadrature.integrate_batch")
+def integrate_batch(f, a, b, params=(), method="gauss_legendre", n=20, panels=1, max_elements=2**22, processes=1):
+    a, b = np.broadcast_arrays(np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64))
+    a, b = a.ravel(), b.ravel()
+    rows = a.size
+    params = [np.broadcast_to(np.asarray(param, dtype=np.float64), (rows,)) for param in params]
+
+    nodes_per_row = _batch_rule(method, n, panels)[0].size
+    rows_per_chunk = max(1, max_elements // nodes_per_row)
+    tasks = [(f, a[start:start + rows_per_chunk], b[start:start + rows_per_chunk],
+              [param[start:start + rows_per_chunk] for param in params], method, n, panels)
+             for start in range(0, rows, rows_per_chunk)]
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if processes == 1 or len(tasks) <= 1:
+        results = [_integrate_rows_packed(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(_integrate_rows_packed, tasks))
+
+    if len(results) == 0:
+        return np.empty(0), np.empty(0)
+    return np.concatenate([values for values, _ in results]), np.concatenate([errors for _, errors in results])
+
+
+
+# Adaptive quadrature with a priority queue of the worst intervals:
+# Every interval carries a value and an error estimate of that same value. While the global error (sum over all
+# intervals) is above tol, the worst intervals are popped until the remaining ones fit in tol (at most batch_size at a
+# time) and split in half; the nodes of all their children are evaluated in a single call. Flat regions are left
+# coarse and the evaluations go to where the integrand changes.
+# cache is an optional dict {x: f(x)} shared between calls, so integrating the same f again over overlapping
+# ranges reuses earlier evaluations. Only cache misses count as evaluations.
+def _cached_evaluate(f, x, args, cache, counter):
+    if cache is None:
+        counter[0] += x.size
+        return _evaluate(f, x, args)
+
+    keys = x.tolist()
+    missing = [k for k, key in enumerate(keys) if key not in cache]
+    if len(missing) > 0:
+        missing_values = _evaluate(f, x[missing], args).tolist()
+        counter[0] += len(missing)
+        for k, value in zip(missing, missing_values):
+            cache[keys[k]] = value
+    return np.array([cache[key] for key in keys])
+
+
+# entries are (error, value, interval) tuples, split(intervals) returns the entries of their halves;
+# returns (value, error, number of intervals)
+def _adaptive_refine(entries, split, tol, batch_size, max_evaluations, counter):
+    heap = []
+    tie_breaker = 0
+    total_error = 0.0   # Running sum of the heap's error estimates
+
+    def push(entries):
+        nonlocal tie_breaker, total_error
+        for error, value, interval in entries:
+            heapq.heappush(heap, (-error, tie_breaker, value, interval))
+            tie_breaker += 1
+            total_error += error
+
+    push(entries)
+    while total_error > tol and counter[0] < max_evaluations:
+        worst = []
+        while heap and total_error > tol and len(worst) < batch_size:
+            entry = heapq.heappop(heap)
+            total_error += entry[0]
+            worst.append(entry[3])
+        push(split(worst))
+
+        if total_error <= tol:      # Before stopping, drop the rounding the running sum picked up
+            total_error = sum(-entry[0] for entry in heap)
+
+    return sum(entry[2] for entry in heap), total_error, len(heap)
+
+
+def _simpson_panel(a, b, fa, fm, fb):
+    return (b - a) / 6 * (fa + 4 * fm + fb)
+
+
+# Interval [a, b] with f at a, the quarter points, the midpoint and b: its value is the Simpson sum of its two halves
+# S_l + S_r, and the Richardson estimate of the error of that sum |S_l + S_r - S|/15
+def _simpson_entry(a, b, fa, fl, fm, fr, fb):
+    m = 0.5 * (a + b)
+    halves = _simpson_panel(a, m, fa, fl, fm) + _simpson_panel(m, b, fm, fr, fb)
+    return abs(halves - _simpson_panel(a, b, fa, fm, fb)) / 15, halves, (a, b, fa, fl, fm, fr, fb)
+
+
+# Adaptive Simpson: the children of a split only need f at the 4 new quarter points (the other 3 nodes are inherited)
+def adaptive_simpson(f, a, b, tol=1e-10, args=(), batch_size=64, max_evaluations=10**7, cache=None, full_output=False):
+    counter = [0]   # Number of integrand evaluations, kept in a list so _cached_evaluate can update it
+    m = 0.5 * (a + b)
+    fa, fl, fm, fr, fb = _cached_evaluate(f, np.array([a, 0.5 * (a + m), m, 0.5 * (m + b), b]), args, cache, counter)
+
+    def split(intervals):
+        new_points = []
+        for a_k, b_k, _, _, _, _, _ in intervals:
+            h = 0.25 * (b_k - a_k)
+            new_points += [a_k + 0.5 * h, a_k + 1.5 * h, a_k + 2.5 * h, a_k + 3.5 * h]
+        new_values = _cached_evaluate(f, np.array(new_points), args, cache, counter).reshape(len(intervals), 4)
+        entries = []
+        for (a_k, b_k, fa_k, fl_k, fm_k, fr_k, fb_k), (f1, f2, f3, f4) in zip(intervals, new_values):
+            m_k = 0.5 * (a_k + b_k)
+            entries.append(_simpson_entry(a_k, m_k, fa_k, f1, fl_k, f2, fm_k))
+            entries.append(_simpson_entry(m_k, b_k, fm_k, f3, fr_k, f4, fb_k))
+        return entries
+
+    value, error, intervals = _adaptive_refine([_simpson_entry(a, b, fa, fl, fm, fr, fb)], split, tol, batch_size, max_evaluations, counter)
+    if not full_output:
+        return _result(value, error)
+    return float(value), float(error), {"evaluations": counter[0], "intervals": intervals, "converged": bool(error <= tol)}
+
+
+
+# Gauss-Kronrod 7-15 nodes on [-1, 1] and the weights of both rules; the Gauss nodes are every second Kronrod node
+_kronrod_half_nodes = np.array([0.991455371120812639206854697526329, 0.949107912342758524526189684047851,
+                                0.864864423359769072789712788640926, 0.741531185599394439863864773280788,
+                                0.586087235467691130294144845693013, 0.405845151377397166906606412076961,
+                                0.207784955007898467600689403773245])
+_kronrod_half_weights = np.array([0.022935322010529224963732008058970, 0.063092092629978553290700663189204,
+                                  0.104790010322250183839876322541518, 0.140653259715525918745189590510238,
+                                  0.169004726639267902826583426598550, 0.190350578064785409913256402421014,
+                                  0.204432940075298892414161999234649])
+_gauss_half_weights = np.array([0.129484966168869693270611432679082, 0.279705391489276667901467771423780,
+                                0.381830050505118944950369775488975])
+_kronrod_nodes = np.concatenate((-_kronrod_half_nodes, [0.0], _kronrod_half_nodes[::-1]))
+_kronrod_weights = np.concatenate((_kronrod_half_weights, [0.209482141084727828012999174891714], _kronrod_half_weights[::-1]))
+_gauss_weights = np.concatenate((_gauss_half_weights, [0.417959183673469387755102040816327], _gauss_half_weights[::-1]))
+
+
+# Entries of the intervals [a_k, b_k], all 15 * len(a) nodes in one call:
+# The value is the Kronrod sum K; its error is QUADPACK's estimate from |K - G| scaled by the spread of f over the
+# interval (resasc * min(1, (200 |K - G| / resasc)^1.5)), which follows the error of K rather than of the 7 point G
+def _gauss_kronrod_entries(f, a, b, args, cache, counter):
+    a, b = np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64)
+    half_width = 0.5 * (b - a)
+    x = 0.5 * (a + b)[:, None] + half_width[:, None] * _kronrod_nodes
+    y = _cached_evaluate(f, x.ravel(), args, cache, counter).reshape(x.shape)
+    kronrod = half_width * (y @ _kronrod_weights)
+    gauss = half_width * (y[:, 1::2] @ _gauss_weights)
+    spread = np.abs(half_width) * (np.abs(y - (kronrod / (2 * half_width))[:, None]) @ _kronrod_weights)
+    error = np.abs(kronrod - gauss)
+    scaled = spread * np.minimum(1.0, (200 * error / np.where(spread > 0, spread, 1.0))**1.5)
+    error = np.where((spread > 0) & (error > 0), scaled, error)
+    return list(zip(error.tolist(), kronrod.tolist(), zip(a.tolist(), b.tolist())))
+
+
+# Adaptive Gauss-Kronrod (G7K15): 15 evaluations per interval, exact for polynomials up to degree 22, so smooth
+# integrands reach small tolerances after a few splits
+def adaptive_gauss_kronrod(f, a, b, tol=1e-10, args=(), batch_size=64, max_evaluations=10**7, cache=None, full_output=False):
+    counter = [0]
+
+    def split(intervals):
+        a_k, b_k = np.array(intervals).T
+        m_k = 0.5 * (a_k + b_k)
+        return _gauss_kronrod_entries(f, np.concatenate((a_k, m_k)), np.concatenate((m_k, b_k)), args, cache, counter)
+
+    entries = _gauss_kronrod_entries(f, [a], [b], args, cache, counter)
+    value, error, intervals = _adaptive_refine(entries, split, tol, batch_size, max_evaluations, counter)
+    if not full_output:
+        return _result(value, error)
+    return float(value), float(error), {"evaluations": counter[0], "intervals": intervals, "converged": bool(error <= tol)}
+
+
+quadrature_rules["adaptive_simpson"] = adaptive_simpson
+quadrature_rules["adaptive_gauss_kronrod"] = adaptive_gauss_kronrod
@@ -0,0 +1,153 @@
+# Streaming Histogram
+
+# Incremental histograms of data that arrives in chunks (or never fits in memory at once):
+#   - fixed bins: bins edges, or a number of bins with range=(low, high); values outside are counted as under/overflow
+#   - adaptive bins: a number of bins without a range; the range follows the data, bins of width 2^k with edges on
+#     multiples of the width, and when a value falls outside the bin width is doubled (pairs of bins are combined)
+#     until everything fits, so no count is ever lost or split; the final grid can depend on the order of the chunks
+# Counts are accumulated into one preallocated int64 array, per chunk with np.bincount, and histograms of parallel
+# workers are merged with merge() (adaptive histograms are regridded to a common grid first)
+# Densities are only computed at the end, density() is normalized over the counts inside the bins like np.histogram
+# plot_histogram() hands the precomputed edges and values to matplotlib's stairs(), matplotlib is imported only there
+#
+# Usage:
+#   histogram = Histogram(50, range=(40, 160))
+#   for chunk in chunks:
+#       histogram.update(chunk)
+#   total = histogram_1.merge(histogram_2)
+#   plot_histogram(histogram, density=True)
+
+
+import numpy as np
+
+
+
+class Histogram:
+    def __init__(self, bins=100, range=None):
+        self.underflow = 0
+        self.overflow = 0
+        self.total = 0      # All counted values, including under/overflow
+        self.range = None if range is None else (float(range[0]), float(range[1]))
+        self.adaptive = np.ndim(bins) == 0 and range is None
+        if np.ndim(bins) == 1:
+            self.edges = np.asarray(bins, dtype=np.float64)
+        elif range is not None:
+            self.edges = np.linspace(range[0], range[1], bins + 1)
+        else:
+            self.edges = None       # Adaptive, no range until the first values are seen
+        self.counts = np.zeros(bins if self.edges is None else self.edges.size - 1, dtype=np.int64)
+        self.low = None             # Adaptive grid: edges low + k*width, width a power of 2 and low a multiple of it
+        self.width = None
+
+    @property
+    def bins(self):
+        return self.counts.size
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return self
+        self.total += values.size
+
+        if self.adaptive:
+            self._cover(values.min(), np.nextafter(values.max(), np.inf))
+            index = np.floor(values / self.width) - self.low / self.width     # Exact, the width is a power of 2
+            self.counts += np.bincount(index.astype(np.int64), minlength=self.bins)
+        else:
+            # np.histogram takes its fast uniform path when the bins came from a range
+            bins = self.edges if self.range is None else self.bins
+            self.counts += np.histogram(values, bins, range=self.range)[0]
+            self.underflow += int((values < self.edges[0]).sum())
+            self.overflow += int((values > self.edges[-1]).sum())
+        return self
+
+    # Combine with the histogram of another (disjoint) part of the data, e.g. from a parallel worker:
+    def merge(self, other):
+        merged = self.copy()
+        return merged._merge_in_place(other)
+
+    def _merge_in_place(self, other):
+        if other.total == 0:
+            return self
+        if self.adaptive != other.adaptive or self.bins != other.bins:
+            raise ValueError("Cannot merge histograms with different bins")
+        if self.adaptive:
+            other = other.copy()
+            if self.edges is None:
+                self._set_grid(other.low, other.width)
+            self._cover(other.low, other.edges[-1], minimum_width=other.width)
+            other._regrid(self.low, self.width)
+        elif not np.array_equal(self.edges, other.edges):
+            raise ValueError("Cannot merge histograms with different bins")
+        self.counts += other.counts
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+        self.total += other.total
+        return self
+
+    def copy(self):
+        copied = Histogram(self.bins, self.range) if self.adaptive or self.range is not None else Histogram(self.edges)
+        copied.counts[:] = self.counts
+        copied.underflow, copied.overflow, copied.total = self.underflow, self.overflow, self.total
+        if self.adaptive and self.edges is not None:
+            copied._set_grid(self.low, self.width)
+        return copied
+
+    # Probability density over the values inside the bins:
+    def density(self):
+        inside = self.counts.sum()
+        return self.counts / (inside * np.diff(self.edges)) if inside > 0 else np.zeros(self.bins)
+
+    def centers(self):
+        return 0.5 * (self.edges[:-1] + self.edges[1:])
+
+
+    def _set_grid(self, low, width):
+        self.low = low
+        self.width = width
+        self.edges = low + width * np.arange(self.bins + 1)
+
+    # Smallest aligned grid, at least minimum_width wide, containing the current bins and [low, high):
+    def _cover(self, low, high, minimum_width=0.0):
+        if self.edges is None:
+            span = high - low
+            if span <= max(abs(low), abs(high), 2.0**-900) * 2.0**-40:     # (Nearly) constant values
+                span = max(abs(low), 1.0)
+            width = 2.0**np.ceil(np.log2(span / self.bins))
+            self._set_grid(np.floor(low / width) * width, width)
+        low = min(low, self.low)
+        high = max(high, self.edges[-1])
+        width = max(self.width, minimum_width)
+        while np.floor(low / width) * width + self.bins * width < high:
+            width *= 2
+        new_low = np.floor(low / width) * width
+        if new_low != self.low or width != self.width:
+            self._regrid(new_low, width)
+
+    # Move the counts to a coarser grid that contains the current one, pairs of bins combine as the width doubles:
+    def _regrid(self, low, width):
+        offset = int(round((self.low - low) / self.width))
+        index = (offset + np.arange(self.bins)) // int(round(width / self.width))
+        counts = np.zeros(self.bins, dtype=np.int64)
+        np.add.at(counts, index, self.counts)
+        self.counts = counts
+        self._set_grid(low, width)
+
+
+
+# Histogram of an iterable of chunks, e.g. csv_chunks() or noise_chunks():
+def histogram_chunks(chunks, bins=100, range=None):
+    histogram = Histogram(bins, range)
+    for chunk in chunks:
+        histogram.update(chunk)
+    return histogram
+
+
+
+# Draw the precomputed bins with stairs(), no data is passed to matplotlib:
+def plot_histogram(histogram, density=True, ax=None, **kwargs):
+    from matplotlib import pyplot
+    ax = pyplot.gca() if ax is None else ax
+    kwargs.setdefault("fill", True)
+    return ax.stairs(histogram.density() if density else histogram.counts, histogram.edges, **kwargs)
@@ -0,0 +1,140 @@
+# Streaming Statistics
+
+# Single-pass, constant-memory statistics of large numeric data sets such as multi-GB CSV files
+# RunningStatistics keeps count, mean, M2 (sum of squared deviations), min, max and an optional fixed-bin histogram.
+# Each chunk is reduced with NumPy (two-pass mean/M2 inside the chunk) and merged with the running values using the
+# pairwise formulas of Chan et al., which are numerically stable and let partial results of parallel workers be merged.
+# csv_statistics() reads a CSV file once, in large chunks, with pandas if available and NumPy block parsing otherwise.
+#
+# Usage:
+#   stats = csv_statistics("random_data.csv", column="normal", bins=np.linspace(-1, 1, 101))
+#   stats.count, stats.mean, stats.std, stats.min, stats.max, stats.histogram
+#   total = stats_part_1.merge(stats_part_2)
+#   stats = csv_statistics("random_data.csv", column="normal", processes=None)     # On all cores
+
+
+import importlib.util
+
+import numpy as np
+
+from instrumentation import count, stage
+
+
+default_chunk_rows = 2**20
+
+
+
+class RunningStatistics:
+    def __init__(self, bins=None):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.bin_edges = None if bins is None else np.asarray(bins, dtype=np.float64)
+        self.histogram = None if bins is None else np.zeros(self.bin_edges.size - 1, dtype=np.int64)
+        self.underflow = 0      # Values outside of the histogram range
+        self.overflow = 0
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]     # Empty cells
+        if values.size == 0:
+            return self
+
+        chunk = RunningStatistics(self.bin_edges)
+        chunk.count = values.size
+        chunk.mean = values.mean()
+        chunk.m2 = ((values - chunk.mean)**2).sum()
+        chunk.min = values.min()
+        chunk.max = values.max()
+        if self.bin_edges is not None:
+            chunk.histogram = np.histogram(values, self.bin_edges)[0]
+            chunk.underflow = int((values < self.bin_edges[0]).sum())
+            chunk.overflow = int((values > self.bin_edges[-1]).sum())
+        return self._merge_in_place(chunk)
+
+    # Combine with the statistics of another (disjoint) part of the data, e.g. from a parallel worker:
+    def merge(self, other):
+        merged = RunningStatistics(self.bin_edges)
+        merged._merge_in_place(self)
+        return merged._merge_in_place(other)
+
+    def _merge_in_place(self, other):
+        if other.count == 0:
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * (other.count / count)
+        self.m2 += other.m2 + delta**2 * (self.count * other.count / count)
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if self.bin_edges is not None:
+            if other.bin_edges is None or not np.array_equal(self.bin_edges, other.bin_edges):
+                raise ValueError("Cannot merge statistics with different histogram bins")
+            self.histogram += other.histogram
+            self.underflow += other.underflow
+            self.overflow += other.overflow
+        return self
+
+    @property
+    def variance(self):     # Sample variance (n - 1)
+        return self.m2 / (self.count - 1) if self.count > 1 else np.nan
+
+    @property
+    def population_variance(self):
+        return self.m2 / self.count if self.count > 0 else np.nan
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+    # Probability density of the histogram, normalized over all counted values (including under/overflow):
+    def histogram_density(self):
+        return self.histogram / (self.count * np.diff(self.bin_edges))
+
+
+
+# Column chunks of a CSV file, with pandas:
+def _pandas_chunks(file_name, column, chunk_rows):
+    import pandas
+    header = 0 if isinstance(column, str) else None
+    for frame in pandas.read_csv(file_name, usecols=[column], header=header, chunksize=chunk_rows, dtype=np.float64,
+                                 float_precision="round_trip"):     # Exact parsing, same values as np.loadtxt
+        yield frame[column].to_numpy()
+
+
+# Column chunks of a CSV file, with NumPy block parsing of chunk_rows lines at a time:
+def _numpy_chunks(file_name, column, chunk_rows):
+    with open(file_name) as file:
+        if isinstance(column, str):
+            header = file.readline().strip().split(",")
+            column = header.index(column)
+        while True:
+            lines = [line for _, line in zip(range(chunk_rows), file)]
+            if len(lines) == 0:
+                return
+            yield np.loadtxt(lines, delimiter=",", usecols=column, dtype=np.float64, ndmin=1)
+
+
+def csv_chunks(file_name, column=0, chunk_rows=default_chunk_rows):
+    if importlib.util.find_spec("pandas") is None:
+        return _numpy_chunks(file_name, column, chunk_rows)
+    return _pandas_chunks(file_name, column, chunk_rows)
+
+
+
+# Statistics of one column of a CSV file in a single pass; column is a header name or a column index (no header)
+# processes != 1 splits the file into byte ranges parsed on a process pool (parallel_csv.py), None uses all cores
+def csv_statistics(file_name, column=0, bins=None, chunk_rows=default_chunk_rows, processes=1):
+    if processes != 1:
+        from parallel_csv import parallel_csv_statistics
+        return parallel_csv_statistics(file_name, column, bins, processes)
+    statistics = RunningStatistics(bins)
+    with stage("csv.statistics", file_name=file_name, chunk_rows=chunk_rows):
+        for values in csv_chunks(file_name, column, chunk_rows):   # Reading time = csv.statistics - csv.update
+            count("csv.rows", values.size)
+            with stage("csv.update", values=values):
+                statistics.update(values)
+    return statistics